@@ -0,0 +1,77 @@
+"""
+Benchmark de memória da divisão em chunks: compara o pico de RSS do
+carregamento completo com pydub (AudioSegment.from_file + fatias) com o
+split_audio_file atual (ffprobe + extração por seek com ffmpeg).
+
+Cada modo roda em um subprocesso próprio. O pico dos processos ffmpeg é
+medido à parte (RUSAGE_CHILDREN) e também não depende da duração da entrada.
+
+Uso:
+    python benchmarks/chunker_memory.py [duração_em_minutos]
+"""
+
+import os
+import sys
+import json
+import shutil
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+def split(mode, audio_file, output_dir):
+    before = peak_rss_mb()
+    if mode == "pydub":
+        # Caminho antigo: o PCM da entrada inteira fica em memória
+        from pydub import AudioSegment
+        from utils.audio_processing import chunk_duration_ms, plan_chunks
+        audio = AudioSegment.from_file(audio_file)
+        chunk_ms = chunk_duration_ms(os.path.getsize(audio_file) / len(audio), 15)
+        for index, (start, duration) in enumerate(plan_chunks(len(audio), chunk_ms)):
+            audio[start:start + duration].export(os.path.join(output_dir, f"chunk_{index}.wav"), format="wav")
+    else:
+        from utils.audio_processing import split_audio_file
+        split_audio_file(audio_file, 15, output_dir=output_dir)
+    print(json.dumps({
+        "mode": mode,
+        "peak_delta_mb": round(peak_rss_mb() - before, 1),
+        "ffmpeg_peak_mb": round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+    }))
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    work_dir = tempfile.mkdtemp()
+    audio_file = os.path.join(work_dir, "entrada.wav")
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y", "-f", "lavfi",
+        "-i", f"sine=frequency=440:duration={minutes * 60:g}",
+        "-ac", "2", "-ar", "44100", audio_file
+    ], check=True)
+
+    try:
+        size_mb = os.path.getsize(audio_file) / 1024 / 1024
+        print(f"Entrada de {minutes:g} min ({size_mb:.0f} MB, WAV estéreo 44,1 kHz):")
+        for mode in ("pydub", "seek"):
+            output_dir = os.path.join(work_dir, mode)
+            os.makedirs(output_dir)
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", mode, audio_file, output_dir],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"  {result['mode']:<6} {result['peak_delta_mb']:>8.1f} MB"
+                  f"  (ffmpeg: {result['ffmpeg_peak_mb']:.1f} MB)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 4 and sys.argv[1] == "--run":
+        split(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        main()
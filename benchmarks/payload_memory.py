@@ -0,0 +1,90 @@
+"""
+Benchmark de memória do envio de um chunk: compara o pico de RSS do corpo
+montado em memória (base64 + dict + json) com o StreamingAudioPayload.
+
+Cada modo roda em um subprocesso próprio para que o pico de um não afete
+o outro. O servidor local apenas lê e descarta o corpo.
+
+Uso:
+    python benchmarks/payload_memory.py [tamanho_do_chunk_mb]
+"""
+
+import os
+import sys
+import json
+import base64
+import resource
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROMPT = "Transcreva este áudio para texto em português."
+
+class SinkHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 65536)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+def peak_rss_mb():
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+def send(mode, audio_file):
+    import requests
+    from services.payload import StreamingAudioPayload
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    before = peak_rss_mb()
+    if mode == "inline":
+        # Caminho antigo: arquivo inteiro -> base64 -> str -> dict -> JSON serializado
+        with open(audio_file, "rb") as f:
+            audio_encoded = base64.b64encode(f.read()).decode("utf-8")
+        payload = {"contents": [{"parts": [
+            {"text": PROMPT},
+            {"inlineData": {"mimeType": "audio/wav", "data": audio_encoded}}
+        ]}]}
+        requests.post(url, json=payload)
+    else:
+        requests.post(url, data=StreamingAudioPayload(PROMPT, audio_file, "audio/wav"),
+                      headers={"Content-Type": "application/json"})
+    server.shutdown()
+    print(json.dumps({"mode": mode, "peak_delta_mb": round(peak_rss_mb() - before, 1)}))
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 15
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(os.urandom(int(size_mb * 1024 * 1024)))
+        audio_file = f.name
+
+    try:
+        print(f"Chunk de {size_mb:g} MB, pico de RSS adicional por chunk em voo:")
+        for mode in ("inline", "streaming"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", mode, audio_file],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"  {result['mode']:<10} {result['peak_delta_mb']:>8.1f} MB")
+    finally:
+        os.remove(audio_file)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "--run":
+        send(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,116 @@
+"""
+Benchmark dos codecs de upload: divide um corpus de referência em chunks em
+cada codec de AUDIO_CODECS e compara os bytes enviados, o tempo de
+codificação e o tempo de envio dos payloads para um servidor local que lê o
+corpo na velocidade do link simulado.
+
+Sem arquivos, o corpus é um áudio sintético (tom modulado com ruído rosa),
+que só serve para comparar tamanhos; para avaliar a qualidade da transcrição
+use gravações reais.
+
+Uso:
+    python benchmarks/upload_codecs.py [--mbps 10] [áudio ...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROMPT = "Transcreva este áudio para texto em português."
+
+class ThrottledSinkHandler(BaseHTTPRequestHandler):
+    # Bytes por segundo lidos do corpo; definido em main()
+    bytes_per_second = None
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        started = time.monotonic()
+        received = 0
+        while remaining > 0:
+            block = self.rfile.read(min(remaining, 65536))
+            remaining -= len(block)
+            received += len(block)
+            # Segura a leitura até o tempo que o link levaria para entregar esses bytes
+            delay = received / self.bytes_per_second - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+def synthetic_corpus(work_dir, minutes=5):
+    """Áudio sintético estéreo de 44,1 kHz, como uma gravação comum"""
+    audio_file = os.path.join(work_dir, "sintetico.wav")
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=220:duration={minutes * 60}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:duration={minutes * 60}",
+        "-filter_complex", "[0]tremolo=f=3:d=0.8[voz];[voz][1]amix=inputs=2",
+        "-ac", "2", "-ar", "44100", audio_file
+    ], check=True)
+    return [audio_file]
+
+def run_codec(codec, corpus, work_dir, url):
+    import requests
+    from config.config import GEMINI_CONFIG
+    from services.payload import StreamingAudioPayload
+    from utils.audio_processing import split_audio_file, audio_mime_type
+
+    GEMINI_CONFIG["upload_codec"]["codec"] = codec
+    chunks = []
+    started = time.perf_counter()
+    for position, audio_file in enumerate(corpus):
+        output_dir = os.path.join(work_dir, codec, str(position))
+        chunks.extend(split_audio_file(audio_file, 15, output_dir=output_dir) or [])
+    encode_seconds = time.perf_counter() - started
+
+    upload_bytes = 0
+    started = time.perf_counter()
+    for chunk in chunks:
+        payload = StreamingAudioPayload(PROMPT, chunk, audio_mime_type(chunk))
+        upload_bytes += len(payload)
+        requests.post(url, data=payload, headers={"Content-Type": "application/json"}).raise_for_status()
+    upload_seconds = time.perf_counter() - started
+    return len(chunks), upload_bytes, encode_seconds, upload_seconds
+
+def main():
+    from utils.audio_processing import AUDIO_CODECS
+
+    parser = argparse.ArgumentParser(description="Compara bytes e latência de envio por codec")
+    parser.add_argument("audio", nargs="*", help="arquivos do corpus de referência")
+    parser.add_argument("--mbps", type=float, default=10, help="velocidade simulada do link de upload")
+    args = parser.parse_args()
+
+    ThrottledSinkHandler.bytes_per_second = args.mbps * 1000 * 1000 / 8
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottledSinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        corpus = args.audio or synthetic_corpus(work_dir)
+        corpus_mb = sum(os.path.getsize(audio_file) for audio_file in corpus) / 1024 / 1024
+        print(f"Corpus: {len(corpus)} arquivo(s), {corpus_mb:.1f} MB; link de {args.mbps:g} Mbps")
+        print(f"  {'codec':<6} {'chunks':>6} {'enviado':>11} {'codificação':>12} {'envio':>9}")
+        for codec in AUDIO_CODECS:
+            count, upload_bytes, encode_seconds, upload_seconds = run_codec(codec, corpus, work_dir, url)
+            print(f"  {codec:<6} {count:>6} {upload_bytes / 1024 / 1024:>8.2f} MB"
+                  f" {encode_seconds:>11.2f}s {upload_seconds:>8.2f}s")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
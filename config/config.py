@@ -10,6 +10,8 @@ load_dotenv()
 # Configurações básicas
 BASE_DIR = Path(__file__).resolve().parent.parent
 OUTPUT_DIR = BASE_DIR / "output_files"
+# Estado persistente entre execuções (não é apagado por clear_output_directory)
+STATE_DIR = BASE_DIR / "state"
 CONFIG_FILE = BASE_DIR / "config" / "user_config.json"
 
 def save_api_key(api_key):
@@ -40,7 +42,9 @@ AUDIO_CONFIG = {
 
 # Configurações da API
 GEMINI_API_KEY = load_api_key()  # Pode ser None inicialmente
-GEMINI_API_URL = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent'
+# As URLs podem ser sobrescritas por variáveis de ambiente (ex.: servidor local de testes)
+GEMINI_API_URL = os.getenv('GEMINI_API_URL', 'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent')
+GEMINI_UPLOAD_URL = os.getenv('GEMINI_UPLOAD_URL', 'https://generativelanguage.googleapis.com/upload/v1beta/files')
 
 # Configurações da requisição Gemini
 GEMINI_CONFIG = {
@@ -48,20 +52,156 @@ GEMINI_CONFIG = {
     "timeout": 60,
     "chunk_size_mb": 10,
     "max_workers": 2,
+    "max_concurrency": 16,
+    "ffmpeg_workers": 4,
+    # Chunks vizinhos se sobrepõem em overlap_seconds; o texto repetido na
+    # sobreposição é alinhado e removido ao juntar as transcrições: pelo menos
+    # stitch_min_words palavras iguais, a até stitch_edge_words palavras das bordas.
+    # Chunks exportados acima do limite de tamanho são divididos de novo até max_resplits vezes.
+    # Com pause_boundaries, cada chunk termina na pausa (trecho de pelo menos pause_min_ms
+    # com energia até pause_margin_db acima do mínimo) mais próxima do fim planejado,
+    # procurando nos últimos pause_tolerance_seconds
+    "chunking": {
+        "overlap_seconds": 2.0,
+        "max_chunk_seconds": 120,
+        "max_resplits": 3,
+        "pause_boundaries": True,
+        "pause_tolerance_seconds": 10.0,
+        "pause_min_ms": 200,
+        "pause_margin_db": 3.0,
+        "stitch_window_words": 30,
+        "stitch_min_words": 3,
+        "stitch_edge_words": 3
+    },
+    # Controle adaptativo (AIMD): max_workers é o limite inicial, max_concurrency o teto
+    "concurrency": {
+        "min": 1,
+        "increase_step": 1,
+        "decrease_factor": 0.5,
+        "latency_tolerance": 2.0,
+        "max_error_rate": 0.2,
+        "window": 20
+    },
+    # Limites por URL de modelo: requisições e tokens de entrada por minuto
+    "rate_limits": {
+        "default": {"rpm": 60, "tpm": 1000000}
+    },
+    # "memory" limita por processo; "file" divide a cota entre processos da máquina
+    "rate_limit_backend": "memory",
+    # Cache em disco das transcrições por chunk (hash do áudio + prompt + modelo)
+    "transcript_cache": {
+        "enabled": True,
+        "max_mb": 200
+    },
+    # Memória das etapas de texto (melhoria e análise) por versão de prompt
+    "stage_memo": {
+        "enabled": True,
+        "max_mb": 50
+    },
+    # Pré-processamento opcional: remove trechos sem fala de pelo menos min_span_seconds
+    # antes de dividir o áudio, mantendo padding_seconds de cada lado. Sem fala é
+    # silêncio (até silence_margin_db acima do ruído de fundo) ou som de energia
+    # constante, como música de espera (desvio menor que steady_std_db em
+    # steady_window_seconds). O job guarda o mapa de tempo para o áudio original
+    "non_speech": {
+        "enabled": False,
+        "min_span_seconds": 5.0,
+        "padding_seconds": 0.5,
+        "silence_margin_db": 10.0,
+        "steady_window_seconds": 1.0,
+        "steady_std_db": 2.0
+    },
+    # Formato dos chunks enviados: "opus" (Ogg), "flac", "mp3" ou "wav" (PCM).
+    # bitrate (bits/s) vale para opus e mp3; sample_rate e channels são tetos,
+    # nunca aumentam os da entrada (a API reduz o áudio para 16 kHz mono de qualquer forma)
+    "upload_codec": {
+        "codec": "opus",
+        "bitrate": 24000,
+        "sample_rate": 16000,
+        "channels": 1
+    },
+    # "inline" envia o áudio em base64 em cada requisição; "files" envia uma única
+    # vez pela API de arquivos (upload resumível) e referencia a URI depois
+    "upload_mode": "inline",
+    # A API de arquivos mantém os uploads por 48h; reaproveita a URI por um pouco menos
+    "file_uri_ttl_hours": 47,
+    # Manifesto por job em state/jobs, usado para retomar transcrições interrompidas
+    "journal": {
+        "enabled": True
+    },
+    # Etapas de texto (melhoria e análise) usam streamGenerateContent e mostram
+    # o texto à medida que chega
+    "streaming": {
+        "enabled": True
+    },
+    # Com concurrent_analysis, a análise não espera a melhoria: usa o texto
+    # melhorado só se ele ficar pronto em analysis_grace_seconds
+    "pipeline": {
+        "concurrent_analysis": True,
+        "analysis_grace_seconds": 2.0
+    },
+    # Modo de requisição única para áudios curtos: transcrição, correção e análise
+    # em uma resposta JSON; se a resposta não for válida, usa as três etapas
+    "one_shot": {
+        "enabled": False,
+        "max_seconds": 120
+    },
+    # Melhoria em janelas paralelas para textos acima de window_chars; cada janela
+    # recebe o fim da anterior (context_chars) apenas como contexto
+    "improve_windows": {
+        "window_chars": 8000,
+        "context_chars": 500
+    },
+    # Resumo em map-reduce para textos longos: janelas resumidas em paralelo e
+    # resumos parciais combinados (em vários níveis, se preciso) no resultado final
+    "summary_map_reduce": {
+        "threshold_chars": 60000,
+        "window_chars": 20000
+    },
+    # Pool de chaves (ConfigManager: GEMINI_API_KEYS e GEMINI_API_KEY, mais a chave
+    # do usuário). Uma chave que recebe 429 fica em pausa pelo Retry-After ou bench_seconds
+    "key_pool": {
+        "bench_seconds": 60
+    },
+    # Disjuntor da API: abre com muitos erros 5xx/falhas de rede e volta com sondas.
+    # mode "fail" falha na hora enquanto aberto; "park" faz os jobs aguardarem
+    "circuit_breaker": {
+        "enabled": True,
+        "window": 20,
+        "min_requests": 5,
+        "error_rate": 0.5,
+        "open_seconds": 30,
+        "half_open_probes": 1,
+        "mode": "fail"
+    },
+    # Agrupa áudios curtos (gravações do microfone, reels) em uma única requisição
+    # com vários trechos; window_seconds é quanto o primeiro clipe espera por outros.
+    # Só entram jobs de um único chunk com até max_source_seconds de áudio de origem
+    "clip_batching": {
+        "enabled": True,
+        "window_seconds": 0.5,
+        "max_source_seconds": 90,
+        "max_clips": 8,
+        "max_clip_mb": 2,
+        "max_batch_mb": 8,
+        "max_batch_seconds": 600
+    },
+    # Requisições duplicadas para chunks que passam do percentil das latências recentes
+    "hedging": {
+        "enabled": False,
+        "percentile": 95,
+        "min_samples": 5,
+        "window": 50
+    },
     "headers": {
         "Content-Type": "application/json"
     }
 }
 
-# Atualizar headers se a chave API existir
-if GEMINI_API_KEY:
-    GEMINI_CONFIG["headers"]["x-goog-api-key"] = GEMINI_API_KEY
-
 def update_api_key(api_key):
     """Atualiza a chave API nas configurações"""
     global GEMINI_API_KEY
     GEMINI_API_KEY = api_key
-    GEMINI_CONFIG["headers"]["x-goog-api-key"] = api_key
     save_api_key(api_key)
 
 def setup_logging():
@@ -28,8 +28,8 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout
                            QDialog, QLineEdit, QFormLayout, QDialogButtonBox, QMessageBox,
                            QHBoxLayout, QGroupBox, QSplitter, QFrame,
                            QStatusBar, QToolButton, QStyleFactory)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize  # Adicionado QSize
-from PyQt5.QtGui import QIcon, QPalette, QColor, QFont
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize, QTimer  # Adicionado QSize
+from PyQt5.QtGui import QIcon, QPalette, QColor, QFont, QTextCursor
 
 # Adiciona o diretório raiz ao PYTHONPATH
 project_root = Path(__file__).resolve().parent
@@ -41,7 +41,11 @@ from services.audio_service import (
     download_tiktok_video,
     download_instagram_story
 )
-from services.transcription_service import process_and_analyze_transcription
+from services.async_engine import run_pipeline, run_resume
+from services.job_journal import list_incomplete_jobs
+from services.circuit_breaker import get_circuit_breaker
+from services.progress import STAGE, CHUNK, PARTIAL
+from services.key_pool import reload_key_pool
 from utils.validators import validate_audio_file, validate_video_file, identify_platform
 from utils.file_manager import clear_output_directory
 from config.config import setup_logging, OUTPUT_DIR, save_api_key, load_api_key, update_api_key
@@ -50,19 +54,41 @@ class TranscriptionWorker(QThread):
     finished = pyqtSignal(tuple)
     error = pyqtSignal(str)
     progress = pyqtSignal(str)
+    chunk_progress = pyqtSignal(int, int)
+    partial_text = pyqtSignal(str, str)
 
-    def __init__(self, audio_file):
+    def __init__(self, audio_file, job_id=None):
         super().__init__()
         self.audio_file = audio_file
+        self.job_id = job_id
+
+    def handle_event(self, event):
+        """Converte os eventos do pipeline em sinais (chamado na thread do worker)"""
+        if event["type"] == STAGE:
+            self.progress.emit(event["message"])
+        elif event["type"] == CHUNK:
+            self.chunk_progress.emit(event["done"], event["total"])
+        elif event["type"] == PARTIAL:
+            self.partial_text.emit(event["stage"], event["text"])
 
     def run(self):
         try:
-            self.progress.emit("Iniciando transcrição...")
-            result = process_and_analyze_transcription(self.audio_file)
+            if self.job_id:
+                self.progress.emit("Retomando transcrição interrompida...")
+                result = run_resume(self.job_id, self.handle_event)
+            else:
+                self.progress.emit("Iniciando transcrição...")
+                result = run_pipeline(self.audio_file, self.handle_event)
             self.finished.emit(result)
         except Exception as e:
             self.error.emit(str(e))
 
+PARTIAL_HEADERS = {
+    "transcription": "Transcrição Original (parcial)",
+    "improve": "Transcrição Melhorada (parcial)",
+    "analysis": "Análise e Percepções (parcial)",
+}
+
 class ApiConfigDialog(QDialog):
     """Diálogo para configurar a chave API"""
     def __init__(self, parent=None):
@@ -193,6 +219,14 @@ class MainWindow(QMainWindow):
         self.status_bar.addPermanentWidget(self.progress_bar)
         self.status_label = QLabel("Pronto")
         self.status_bar.addWidget(self.status_label)
+        self.api_status_label = QLabel()
+        self.status_bar.addPermanentWidget(self.api_status_label)
+        self.update_api_status()
+
+        # Atualiza periodicamente o estado do circuito da API
+        self.api_status_timer = QTimer(self)
+        self.api_status_timer.timeout.connect(self.update_api_status)
+        self.api_status_timer.start(1000)
 
         # Adiciona widgets ao layout principal
         main_layout.addWidget(toolbar_group)
@@ -213,6 +247,8 @@ class MainWindow(QMainWindow):
         if not load_api_key():
             self.show_config_dialog()
 
+        self.check_incomplete_jobs()
+
     def create_tool_button(self, icon_text, tooltip):
         """Cria um botão de ferramenta estilizado"""
         button = QToolButton()
@@ -269,13 +305,57 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.show_error(f"Erro no processamento: {e}")
 
-    def process_audio(self, audio_file):
-        self.worker = TranscriptionWorker(audio_file)
+    def update_api_status(self):
+        """Mostra na barra de status se a API Gemini está normal ou instável"""
+        self.api_status_label.setText(f"API: {get_circuit_breaker().status_text()}")
+
+    def check_incomplete_jobs(self):
+        """Oferece retomar a transcrição interrompida mais recente"""
+        jobs = list_incomplete_jobs()
+        if not jobs:
+            return
+        answer = QMessageBox.question(
+            self,
+            "Transcrição interrompida",
+            f"Há uma transcrição incompleta: {jobs[0].summary()}.\n"
+            "Deseja retomá-la? Apenas os trechos que faltam serão enviados.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if answer == QMessageBox.Yes:
+            self.process_audio(jobs[0].audio_file, job_id=jobs[0].job_id)
+
+    def process_audio(self, audio_file, job_id=None):
+        self.transcription_output.clear()
+        self.partial_sections = {}
+        self.progress_bar.setRange(0, 0)  # Indeterminado até o plano de chunks ficar pronto
+        self.worker = TranscriptionWorker(audio_file, job_id)
         self.worker.finished.connect(self.handle_results)
         self.worker.error.connect(self.show_error)
         self.worker.progress.connect(self.update_status)
+        self.worker.chunk_progress.connect(self.update_chunk_progress)
+        self.worker.partial_text.connect(self.append_partial_text)
         self.worker.start()
 
+    def update_chunk_progress(self, done, total):
+        """Avança a barra de progresso conforme os chunks são transcritos"""
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+
+    def append_partial_text(self, stage, text):
+        """Acrescenta o trecho mais recente de uma etapa (transcrição, melhoria ou análise)"""
+        # Trechos da última seção exibida são acrescentados no fim; se outra
+        # etapa recebeu texto nesse meio tempo, o conteúdo é redesenhado
+        is_last = bool(self.partial_sections) and list(self.partial_sections)[-1] == stage
+        self.partial_sections[stage] = self.partial_sections.get(stage, "") + text
+        if is_last:
+            self.transcription_output.moveCursor(QTextCursor.End)
+            self.transcription_output.insertPlainText(text)
+        else:
+            self.transcription_output.setPlainText("\n\n".join(
+                f"{PARTIAL_HEADERS[name]}:\n{content}" for name, content in self.partial_sections.items()
+            ))
+        self.transcription_output.moveCursor(QTextCursor.End)
+
     def handle_results(self, results):
         transcricao, transcricao_melhorada, analise = results
         output_text = ""
@@ -290,12 +370,16 @@ class MainWindow(QMainWindow):
             output_text += "Análise e Percepções:\n" + analise
 
         self.transcription_output.setText(output_text)
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
         self.status_label.setText("Processamento concluído")
 
     def show_error(self, message):
         """Mostra erro na barra de status"""
         self.status_label.setText(f"Erro: {message}")
         self.status_label.setStyleSheet("color: #f44336;")  # Vermelho
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
         logging.error(message)
 
     def update_status(self, message):
@@ -309,6 +393,8 @@ class MainWindow(QMainWindow):
             api_key = dialog.get_api_key()
             if api_key:
                 update_api_key(api_key)  # Usar nova função
+                # Requisições em andamento mantêm a chave com que começaram
+                reload_key_pool()
                 self.status_label.setText("Chave API configurada com sucesso")
             else:
                 QMessageBox.warning(
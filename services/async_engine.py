@@ -0,0 +1,508 @@
+import os
+import json
+import time
+import queue
+import asyncio
+import tempfile
+import threading
+import logging
+from config.config import OUTPUT_DIR, GEMINI_API_URL, GEMINI_CONFIG
+from .gemini_client import AsyncGeminiClient, extract_text
+from .media_upload import build_audio_payload
+from .job_journal import JobJournal, CHUNK_DONE, journal_enabled
+from .hedging import hedged_post
+from .retry import post_with_retries_async
+from .clip_batcher import get_clip_batcher
+from .transcript_cache import get_transcript_cache, transcript_cache_key
+from .audio_processing import stitch_texts, TranscriptStitcher
+from .progress import ProgressReporter, RESULT
+from .non_speech import non_speech_enabled, condense_audio
+from utils.audio_processing import (
+    plan_windows, plan_chunk_duration_ms, ffprobe_audio_args, parse_audio_info, export_format,
+    audio_mime_type, ffmpeg_extract_args, extract_fitting
+)
+from utils.metrics import metrics
+from .transcription_service import improve_transcript, generate_summary_and_insights
+
+TRANSCRIPTION_PROMPT = "Transcreva este áudio para texto em português."
+
+# Modo de requisição única: as três etapas em uma resposta JSON com esquema
+ONE_SHOT_PROMPT = """Transcreva este áudio para texto em português e responda em JSON com os campos:
+                    raw: a transcrição literal do áudio
+                    improved: a transcrição com ortografia e gramática corrigidas,
+                    mantendo o significado original e preservando os diálogos
+                    analysis: uma análise do texto com
+                    1. Um breve resumo (2-3 frases)
+                    2. Principais pontos (máximo 3)
+                    3. Tom da conversa/conteúdo
+                    4. Insights adicionais relevantes"""
+
+ONE_SHOT_FIELDS = ("raw", "improved", "analysis")
+
+ONE_SHOT_GENERATION_CONFIG = {
+    "responseMimeType": "application/json",
+    "responseSchema": {
+        "type": "OBJECT",
+        "properties": {field: {"type": "STRING"} for field in ONE_SHOT_FIELDS},
+        "required": list(ONE_SHOT_FIELDS)
+    }
+}
+
+STAGE_LABELS = {
+    "one_shot": "requisição única",
+    "transcription": "transcrição",
+    "improve": "melhoria",
+    "analysis": "análise",
+    "improve_first_text": "primeiro texto da melhoria",
+    "analysis_first_text": "primeiro texto da análise",
+    "total": "total",
+}
+
+def parse_one_shot(text):
+    """Extrai (raw, improved, analysis) da resposta JSON; None se ela não for válida"""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    values = tuple(data.get(field) for field in ONE_SHOT_FIELDS)
+    if not all(isinstance(value, str) and value.strip() for value in values):
+        return None
+    return values
+
+class AsyncTranscriptionEngine:
+    """Motor de transcrição assíncrono: divide o áudio com ffmpeg e envia os chunks em paralelo"""
+
+    def __init__(self, max_concurrency=None, chunk_size_mb=None, on_event=None):
+        self.max_concurrency = max_concurrency or GEMINI_CONFIG["max_concurrency"]
+        self.chunk_size_mb = chunk_size_mb or GEMINI_CONFIG["chunk_size_mb"]
+        self.progress = ProgressReporter(on_event)
+        self.client = None
+        self._ffmpeg_slots = None
+        self._batcher = None
+        self.time_map = None
+        self.stats = {"chunks": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_skipped": 0}
+
+    async def __aenter__(self):
+        # O semáforo é criado aqui para ficar preso ao loop em execução; as
+        # requisições são limitadas pelo controle adaptativo de concorrência
+        self._ffmpeg_slots = asyncio.Semaphore(GEMINI_CONFIG["ffmpeg_workers"])
+        self.client = AsyncGeminiClient(self.max_concurrency)
+        await self.client.__aenter__()
+        # Com o job registrado, o agrupador de clipes sabe se vale esperar por outros
+        self._batcher = get_clip_batcher()
+        if self._batcher:
+            self._batcher.job_started()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._batcher:
+            self._batcher.job_finished()
+        await self.client.close()
+
+    async def _run_process(self, *args):
+        """Executa um processo externo sem bloquear o loop e devolve (código, stdout, stderr)"""
+        async with self._ffmpeg_slots:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+            return process.returncode, stdout, stderr
+
+    async def probe_audio(self, audio_file):
+        """Obtém a duração e o formato do áudio via ffprobe (ver parse_audio_info)"""
+        returncode, stdout, stderr = await self._run_process(*ffprobe_audio_args(audio_file))
+        if returncode != 0:
+            logging.error(f"Erro no ffprobe: {stderr.decode(errors='ignore')}")
+            return None
+        return parse_audio_info(stdout.decode())
+
+    async def _extract_chunk(self, audio_file, chunk_path, start_ms, duration_ms, fmt):
+        """Extrai um trecho do áudio no formato de exportação usando seek do ffmpeg"""
+        returncode, _, stderr = await self._run_process(
+            *ffmpeg_extract_args(audio_file, chunk_path, start_ms, duration_ms, fmt)
+        )
+        if returncode != 0:
+            logging.error(f"Erro ao extrair {chunk_path}: {stderr.decode(errors='ignore')}")
+            return None
+        return chunk_path
+
+    async def _extract_fitting(self, audio_file, chunk_path, start_ms, duration_ms, fmt):
+        """extract_fitting em outra thread, dentro do limite de processos ffmpeg simultâneos"""
+        async with self._ffmpeg_slots:
+            return await asyncio.to_thread(
+                extract_fitting, audio_file, chunk_path, start_ms, duration_ms, fmt, self.chunk_size_mb
+            )
+
+    async def split(self, audio_file, output_dir=OUTPUT_DIR):
+        """Divide o áudio em chunks extraídos em paralelo pelo ffmpeg; retorna o plano de chunks"""
+        info = await self.probe_audio(audio_file)
+        if not info or not info["duration_ms"]:
+            return None
+
+        # Opcional: trechos longos sem fala saem antes da divisão; o plano guarda
+        # a posição de cada chunk no áudio original
+        source = audio_file
+        if non_speech_enabled():
+            async with self._ffmpeg_slots:
+                condensed = await asyncio.to_thread(condense_audio, audio_file, info, output_dir)
+            if condensed:
+                source, self.time_map, self.stats["non_speech"] = condensed
+                info = await self.probe_audio(source)
+                if not info or not info["duration_ms"]:
+                    return None
+
+        try:
+            # Mesmo planejamento de split_audio_file: pelo tamanho real do formato exportado
+            fmt = export_format(info)
+            chunk_duration = plan_chunk_duration_ms(source, info, fmt, self.chunk_size_mb)
+            # A análise de pausas lê o áudio inteiro uma vez, em blocos, em outra thread
+            async with self._ffmpeg_slots:
+                windows = await asyncio.to_thread(plan_windows, source, info["duration_ms"], chunk_duration)
+
+            # Chunks vizinhos se sobrepõem; o texto repetido é removido por stitch_texts
+            os.makedirs(output_dir, exist_ok=True)
+            fitted = await asyncio.gather(*(
+                self._extract_fitting(source, os.path.join(output_dir, f"chunk_{index}.{fmt['extension']}"),
+                                      start, duration, fmt)
+                for index, (start, duration) in enumerate(windows)
+            ))
+        finally:
+            if source != audio_file:
+                os.remove(source)
+        if not all(fitted):
+            return None
+
+        # Chunks divididos de novo entram no plano no lugar do original, na mesma ordem
+        return [{
+            "index": index,
+            "start_ms": start,
+            "duration_ms": duration,
+            "original_start_ms": self.time_map.to_original(start) if self.time_map else start,
+            "path": path,
+        } for index, (path, start, duration) in enumerate(window for parts in fitted for window in parts)]
+
+    async def transcribe_chunk(self, chunk_path, index, prompt=TRANSCRIPTION_PROMPT, source_seconds=None):
+        """
+        Transcreve um chunk; a concorrência é controlada pelo cliente.
+        source_seconds só é informado quando o chunk é a entrada inteira do
+        job, o único caso em que ele pode ir junto com outros clipes curtos.
+        """
+        # Consulta o cache antes de codificar e enviar o áudio
+        cache = get_transcript_cache()
+        if cache:
+            cache_key = await asyncio.to_thread(transcript_cache_key, chunk_path, prompt, GEMINI_API_URL)
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                logging.info(f"Chunk {index} obtido do cache")
+                return cached
+
+        # Entradas curtas vão junto com as de outros jobs em uma única requisição;
+        # se o lote não trouxer a transcrição deste clipe, segue com a requisição individual
+        batcher = get_clip_batcher() if source_seconds is not None else None
+        if batcher and await asyncio.to_thread(batcher.accepts, chunk_path, source_seconds):
+            text = await asyncio.wrap_future(batcher.submit(chunk_path, audio_mime_type(chunk_path)))
+            if text:
+                logging.info(f"Chunk {index} transcrito em lote")
+                if cache:
+                    await asyncio.to_thread(cache.put, cache_key, text)
+                return text
+
+        # Inline: o áudio é codificado em blocos durante o envio; no modo "files"
+        # é enviado uma única vez e as tentativas seguintes usam a mesma URI
+        payload = await asyncio.to_thread(build_audio_payload, prompt, chunk_path, audio_mime_type(chunk_path))
+
+        label = f"Chunk {index}"
+        text = await post_with_retries_async(lambda: hedged_post(self.client, payload, self.stats, label), label)
+        if text:
+            logging.info(f"Chunk {index} processado com sucesso")
+            if cache:
+                await asyncio.to_thread(cache.put, cache_key, text)
+        return text
+
+    async def _plan(self, audio_file, journal):
+        """Plano de chunks do job: reaproveita o do manifesto ou divide o áudio"""
+        if journal and journal.has_plan():
+            return journal.chunks
+
+        source = audio_file or journal.audio_file
+        if not os.path.exists(source):
+            logging.error(f"Áudio de origem não encontrado: {source}")
+            return None
+
+        output_dir = str(journal.chunk_dir) if journal else OUTPUT_DIR
+        chunks = await self.split(source, output_dir)
+        if chunks and journal:
+            non_speech = None
+            if self.time_map:
+                non_speech = {**self.stats["non_speech"], "time_map": self.time_map.segments}
+            await asyncio.to_thread(journal.set_plan, chunks, non_speech)
+            return journal.chunks
+        return chunks
+
+    async def transcribe(self, audio_file, journal=None):
+        """
+        Transcreve o arquivo inteiro, enviando todos os chunks simultaneamente.
+        Com o journal ativo, cada chunk concluído é registrado em disco e uma
+        nova execução transcreve apenas os chunks pendentes ou que falharam.
+        """
+        self.progress.stage("transcription")
+        if journal is None and journal_enabled():
+            journal = await asyncio.to_thread(JobJournal.open_or_create, audio_file)
+
+        chunks = await self._plan(audio_file, journal)
+        if not chunks:
+            logging.error("Falha ao dividir o áudio em chunks")
+            return None
+
+        pending = [chunk for chunk in chunks if chunk.get("status") != CHUNK_DONE]
+        logging.info(f"Transcrevendo {len(pending)} de {len(chunks)} chunks com até {self.max_concurrency} conexões simultâneas")
+
+        # Os chunks terminam fora de ordem; o texto parcial é liberado em ordem,
+        # assim que todos os chunks anteriores estiverem prontos
+        finished = {chunk["index"]: chunk["text"] for chunk in chunks if chunk.get("status") == CHUNK_DONE}
+        stitcher = TranscriptStitcher()
+        next_index = 0
+
+        def release():
+            nonlocal next_index
+            while next_index in finished:
+                self.progress.partial(stitcher.add(finished[next_index]))
+                next_index += 1
+
+        self.progress.chunk(len(finished), len(chunks))
+        release()
+
+        # Só um job de chunk único pode ser agrupado com outros clipes curtos
+        source_seconds = chunks[0]["duration_ms"] / 1000 if len(chunks) == 1 else None
+
+        async def run(chunk):
+            text = await self.transcribe_chunk(chunk["path"], chunk["index"] + 1, source_seconds=source_seconds)
+            if journal:
+                journal.mark_chunk(chunk["index"], text)
+            finished[chunk["index"]] = text
+            self.progress.chunk(len(finished), len(chunks))
+            release()
+            return text
+
+        transcriptions = await asyncio.gather(*(run(chunk) for chunk in pending))
+        self.progress.partial(stitcher.finish())
+        self.stats["chunks"] += len(pending)
+        logging.info(f"Estatísticas do job: {self.stats}")
+
+        cache = get_transcript_cache()
+        if cache:
+            logging.info(f"Cache de transcrições: {cache.stats()}")
+
+        if journal:
+            await asyncio.to_thread(journal.finish)
+            transcriptions = journal.texts()
+
+        if not any(transcriptions):
+            logging.error("Nenhum chunk foi transcrito com sucesso")
+            return None
+
+        return stitch_texts(transcriptions)
+
+    async def one_shot(self, audio_file):
+        """
+        Transcrição, correção e análise em uma única requisição com resposta
+        JSON. Retorna None se o áudio for longo demais para o modo ou se a
+        resposta não puder ser interpretada, para que o chamador use as três etapas.
+        """
+        info = await self.probe_audio(audio_file)
+        if not info or not info["duration_ms"] or info["duration_ms"] > GEMINI_CONFIG["one_shot"]["max_seconds"] * 1000:
+            return None
+        duration_ms = info["duration_ms"]
+
+        # Arquivo temporário por job: pipelines simultâneos (GUI e CLI) não se sobrescrevem
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        fmt = export_format(info)
+        fd, audio_path = tempfile.mkstemp(prefix="one_shot_", suffix=f".{fmt['extension']}", dir=OUTPUT_DIR)
+        os.close(fd)
+        try:
+            if not await self._extract_chunk(audio_file, audio_path, 0, duration_ms, fmt):
+                return None
+            return await self._one_shot_request(audio_path, fmt)
+        finally:
+            os.remove(audio_path)
+
+    async def _one_shot_request(self, audio_path, fmt):
+        """Envia o áudio já extraído no modo de requisição única, consultando o cache antes"""
+        cache = get_transcript_cache()
+        if cache:
+            cache_key = await asyncio.to_thread(transcript_cache_key, audio_path, ONE_SHOT_PROMPT, GEMINI_API_URL)
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                logging.info("Resultado da requisição única obtido do cache")
+                return parse_one_shot(cached)
+
+        payload = await asyncio.to_thread(
+            build_audio_payload, ONE_SHOT_PROMPT, audio_path, fmt["mime_type"], ONE_SHOT_GENERATION_CONFIG
+        )
+        try:
+            response = await self.client.post(payload)
+        except Exception as e:
+            logging.warning(f"Requisição única falhou, usando as três etapas: {e}")
+            return None
+        if response.status_code != 200:
+            logging.warning(f"Requisição única falhou ({response.status_code}), usando as três etapas")
+            return None
+
+        text = extract_text(response.json())
+        result = parse_one_shot(text)
+        if result is None:
+            logging.warning("Resposta JSON da requisição única inválida, usando as três etapas")
+            return None
+        if cache:
+            await asyncio.to_thread(cache.put, cache_key, text)
+        logging.info("Transcrição, melhoria e análise obtidas em uma única requisição")
+        return result
+
+    async def process_and_analyze(self, audio_file, journal=None):
+        """Transcrição completa com melhoria e análise"""
+        timings = {}
+        started = time.monotonic()
+        try:
+            # Jobs retomados seguem pelo journal; os demais tentam antes a requisição única
+            if journal is None and GEMINI_CONFIG["one_shot"]["enabled"]:
+                self.progress.stage("one_shot")
+                result = await _timed(timings, "one_shot", self.one_shot(audio_file))
+                if result:
+                    self.progress.chunk(1, 1)
+                    self.progress.partial(result[0])
+                    return result
+
+            transcricao = await _timed(timings, "transcription", self.transcribe(audio_file, journal))
+            if not transcricao:
+                return None, None, None
+
+            def stream_to(stage):
+                # Repassa o texto em streaming da etapa e marca o tempo até o primeiro trecho
+                def on_text(text):
+                    timings.setdefault(f"{stage}_first_text", time.monotonic() - stage_started[stage])
+                    self.progress.partial(text, stage)
+                return on_text
+
+            stage_started = {"improve": time.monotonic()}
+
+            # As etapas de texto rodam fora do loop para não bloqueá-lo
+            self.progress.stage("improve")
+            improve = asyncio.ensure_future(_timed(
+                timings, "improve", asyncio.to_thread(improve_transcript, transcricao, on_text=stream_to("improve"))
+            ))
+            settings = GEMINI_CONFIG["pipeline"]
+            if settings["concurrent_analysis"]:
+                # A análise usa o texto melhorado só se ele ficar pronto dentro
+                # da carência; senão parte da transcrição original, em paralelo
+                done, _ = await asyncio.wait({improve}, timeout=settings["analysis_grace_seconds"])
+                analysis_text = (improve.result() if done else None) or transcricao
+                if not done:
+                    logging.info("Análise iniciada a partir da transcrição original, em paralelo com a melhoria")
+                self.progress.stage("analysis")
+                stage_started["analysis"] = time.monotonic()
+                analise = await _timed(timings, "analysis", asyncio.to_thread(
+                    generate_summary_and_insights, analysis_text, on_text=stream_to("analysis")
+                ))
+                transcricao_melhorada = await improve or transcricao
+            else:
+                transcricao_melhorada = await improve or transcricao
+                self.progress.stage("analysis")
+                stage_started["analysis"] = time.monotonic()
+                analise = await _timed(timings, "analysis", asyncio.to_thread(
+                    generate_summary_and_insights, transcricao_melhorada, on_text=stream_to("analysis")
+                ))
+
+            return transcricao, transcricao_melhorada, analise
+        finally:
+            timings["total"] = time.monotonic() - started
+            for stage, seconds in timings.items():
+                metrics.set_gauge(f"pipeline.{stage}_seconds", round(seconds, 3))
+            logging.info("Tempos por etapa: " + ", ".join(
+                f"{STAGE_LABELS[stage]} {seconds:.1f}s" for stage, seconds in timings.items()
+            ))
+
+    async def resume(self, job_id):
+        """Retoma um job interrompido, transcrevendo apenas os chunks que faltam"""
+        journal = JobJournal.open(job_id)
+        if not journal:
+            logging.error(f"Job não encontrado: {job_id}")
+            return None, None, None
+        return await self.process_and_analyze(journal.audio_file, journal)
+
+async def _timed(timings, stage, awaitable):
+    """Aguarda a etapa e registra sua duração em `timings`"""
+    start = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = time.monotonic() - start
+
+async def _transcribe(audio_file, on_event=None):
+    async with AsyncTranscriptionEngine(on_event=on_event) as engine:
+        return await engine.transcribe(audio_file)
+
+async def _process_and_analyze(audio_file, on_event=None):
+    async with AsyncTranscriptionEngine(on_event=on_event) as engine:
+        return await engine.process_and_analyze(audio_file)
+
+async def _resume(job_id, on_event=None):
+    async with AsyncTranscriptionEngine(on_event=on_event) as engine:
+        return await engine.resume(job_id)
+
+def run_transcription(audio_file, on_event=None):
+    """Executa a transcrição assíncrona a partir de código síncrono"""
+    try:
+        return asyncio.run(_transcribe(audio_file, on_event))
+    except Exception as e:
+        logging.error(f"Erro no processamento da transcrição: {e}")
+        return None
+
+def run_pipeline(audio_file, on_event=None):
+    """
+    Executa transcrição, melhoria e análise a partir de código síncrono.
+    on_event recebe os eventos de progresso (ver services/progress.py)
+    na thread do pipeline, à medida que os chunks e etapas terminam.
+    """
+    try:
+        return asyncio.run(_process_and_analyze(audio_file, on_event))
+    except Exception as e:
+        logging.error(f"Erro no processamento completo: {e}")
+        return None, None, None
+
+def run_resume(job_id, on_event=None):
+    """Retoma um job interrompido a partir de código síncrono"""
+    try:
+        return asyncio.run(_resume(job_id, on_event))
+    except Exception as e:
+        logging.error(f"Erro ao retomar job {job_id}: {e}")
+        return None, None, None
+
+def iter_pipeline(audio_file=None, job_id=None):
+    """
+    Versão geradora de run_pipeline/run_resume: produz os eventos de progresso
+    conforme acontecem e, por último, um evento RESULT com a tupla final.
+    """
+    events = queue.Queue()
+
+    def worker():
+        result = (None, None, None)
+        try:
+            if job_id:
+                result = run_resume(job_id, events.put)
+            else:
+                result = run_pipeline(audio_file, events.put)
+        finally:
+            events.put({"type": RESULT, "result": result})
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    while True:
+        event = events.get()
+        yield event
+        if event["type"] == RESULT:
+            break
+    thread.join()
@@ -1,47 +1,109 @@
-import os
-import wave
-import math
-from pydub import AudioSegment
-import logging
-from config.config import OUTPUT_DIR
-
-def split_audio(input_file, max_size_mb=15):
-    """
-    Divide um arquivo de áudio em partes menores
-    """
-    try:
-        # Carregar o áudio
-        audio = AudioSegment.from_file(input_file)
-        
-        # Calcular duração total em milissegundos
-        duration_ms = len(audio)
-        
-        # Estimar o tamanho por minuto
-        size_bytes = os.path.getsize(input_file)
-        bytes_per_ms = size_bytes / duration_ms
-        
-        # Calcular a duração máxima por chunk para ficar dentro do limite
-        max_size_bytes = max_size_mb * 1024 * 1024  # Converter MB para bytes
-        chunk_duration = math.floor(max_size_bytes / bytes_per_ms)
-        
-        chunks = []
-        for start in range(0, duration_ms, chunk_duration):
-            # Extrair chunk do áudio
-            end = min(start + chunk_duration, duration_ms)
-            chunk = audio[start:end]
-            
-            # Salvar chunk
-            chunk_path = os.path.join(OUTPUT_DIR, f"chunk_{len(chunks)}.wav")
-            chunk.export(chunk_path, format="wav")
-            chunks.append(chunk_path)
-            
-        return chunks
-    except Exception as e:
-        logging.error(f"Erro ao dividir áudio: {e}")
-        return []
-
-def combine_texts(texts):
-    """
-    Combina múltiplos textos em um só
-    """
-    return " ".join(text for text in texts if text)
+import re
+from config.config import GEMINI_CONFIG
+
+def _normalize_word(word):
+    return re.sub(r"\W+", "", word.lower())
+
+def _words(text):
+    """Palavras do texto com a posição de cada uma: (início, fim, forma normalizada)"""
+    return [(m.start(), m.end(), _normalize_word(m.group())) for m in re.finditer(r"\S+", text)]
+
+def _find_overlap(tail, head, min_words, edge_words):
+    """
+    Trecho comum entre o fim do primeiro chunk e o início do segundo. Só vale
+    uma sequência que termina a até edge_words palavras do fim de tail e
+    começa a até edge_words palavras do início de head, que é onde a
+    sobreposição dos chunks fica; frases repetidas em outro ponto do texto
+    não contam. Retorna (fim em tail, fim em head) ou None.
+    """
+    best = None
+    for end in range(len(tail), max(len(tail) - edge_words, 0) - 1, -1):
+        for start in range(min(edge_words, len(head)) + 1):
+            for size in range(min(end, len(head) - start), min_words - 1, -1):
+                if tail[end - size:end] == head[start:start + size]:
+                    # Maior sequência primeiro; no empate, a mais perto das bordas
+                    score = (size, -(len(tail) - end) - start)
+                    if best is None or score > best[0]:
+                        best = (score, end, start + size)
+                    break
+    return best and best[1:]
+
+def _stitch_pair(left, right, window_words, min_words, edge_words):
+    """
+    Junta dois textos de chunks vizinhos. Procura a sequência de palavras
+    comum ao fim do primeiro e ao início do segundo (a região sobreposta) e
+    mantém apenas uma cópia, emendando os textos originais nesse ponto para
+    preservar quebras de linha e falas; sem alinhamento, apenas concatena.
+    """
+    left_words = _words(left)
+    right_words = _words(right)
+    tail = left_words[-window_words:]
+    head = right_words[:window_words]
+
+    overlap = _find_overlap([w[2] for w in tail], [w[2] for w in head], min_words, edge_words)
+    if overlap is None:
+        return f"{left} {right}"
+
+    # Palavras depois do trecho comum no fim do primeiro chunk foram cortadas
+    # na fronteira; a versão inteira está no segundo chunk
+    tail_end, head_end = overlap
+    return left[:tail[tail_end - 1][1]] + right[head[head_end - 1][1]:]
+
+class TranscriptStitcher:
+    """
+    Junta as transcrições dos chunks à medida que chegam, na ordem do plano.
+    Como o alinhamento com o chunk seguinte só pode alterar as últimas
+    stitch_window_words palavras, add() devolve apenas o trecho que já não
+    muda mais; finish() devolve o restante. Os trechos são pedaços exatos do
+    texto final: concatenados, reproduzem stitch_texts.
+    """
+
+    def __init__(self):
+        settings = GEMINI_CONFIG["chunking"]
+        self.window_words = settings["stitch_window_words"]
+        self.min_words = settings["stitch_min_words"]
+        self.edge_words = settings["stitch_edge_words"]
+        self.text = None
+        self.emitted_chars = 0
+        self._previous_missing = False
+
+    def add(self, text):
+        """Acrescenta o texto do próximo chunk (None se ele falhou) e devolve o trecho estável novo"""
+        if not text:
+            self._previous_missing = True
+            return ""
+        if self.text is None:
+            self.text = text
+        elif self._previous_missing:
+            self.text = f"{self.text} {text}"
+        else:
+            self.text = _stitch_pair(self.text, text, self.window_words, self.min_words, self.edge_words)
+        self._previous_missing = False
+
+        # O trecho estável termina antes da primeira palavra que ainda pode mudar
+        words = _words(self.text)
+        if len(words) <= self.window_words:
+            return ""
+        return self._release(words[-self.window_words][0])
+
+    def finish(self):
+        """Devolve o trecho ainda não liberado por add()"""
+        return self._release(len(self.text) if self.text else 0)
+
+    def _release(self, stable_chars):
+        if stable_chars <= self.emitted_chars:
+            return ""
+        released = self.text[self.emitted_chars:stable_chars]
+        self.emitted_chars = stable_chars
+        return released
+
+def stitch_texts(texts):
+    """
+    Combina as transcrições de chunks sobrepostos, na ordem do plano,
+    removendo o texto duplicado nas fronteiras. Entradas None (chunks que
+    falharam) interrompem o alinhamento entre os vizinhos.
+    """
+    stitcher = TranscriptStitcher()
+    for text in texts:
+        stitcher.add(text)
+    return stitcher.text or ""
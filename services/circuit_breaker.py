@@ -0,0 +1,136 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from config.config import GEMINI_CONFIG
+from utils.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_LABELS = {
+    CLOSED: "normal",
+    OPEN: "instável (circuito aberto)",
+    HALF_OPEN: "testando recuperação",
+}
+
+class CircuitOpenError(Exception):
+    """A API está indisponível e o circuito está aberto"""
+
+class CircuitBreaker:
+    """
+    Disjuntor em volta da API Gemini, compartilhado por todos os jobs do processo.
+    Abre quando a taxa de erro recente passa do limite; enquanto aberto, as
+    requisições falham na hora (modo "fail") ou aguardam (modo "park"). Depois
+    de open_seconds passa a meio-aberto e deixa passar algumas sondas: se elas
+    funcionam o circuito fecha, senão volta a abrir.
+    """
+
+    def __init__(self):
+        settings = GEMINI_CONFIG["circuit_breaker"]
+        self.enabled = settings["enabled"]
+        self.min_requests = settings["min_requests"]
+        self.error_rate = settings["error_rate"]
+        self.open_seconds = settings["open_seconds"]
+        self.half_open_probes = settings["half_open_probes"]
+        self.mode = settings["mode"]
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._outcomes = deque(maxlen=settings["window"])
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logging.warning(f"Circuito da API Gemini: {self.state} -> {state}")
+        metrics.incr(f"circuit_breaker.{state}")
+        metrics.set_gauge("circuit_breaker.state", state)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self.probes_in_flight = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def _try_pass(self):
+        """Decide se a requisição pode seguir; retorna (pode, é_sonda, segundos_de_espera)"""
+        with self._lock:
+            if not self.enabled or self.state == CLOSED:
+                return True, False, 0
+            if self.state == OPEN:
+                remaining = self.opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    return False, False, remaining
+                self._transition(HALF_OPEN)
+            if self.probes_in_flight < self.half_open_probes:
+                self.probes_in_flight += 1
+                return True, True, 0
+            return False, False, 1.0
+
+    def _blocked(self, wait):
+        metrics.incr("circuit_breaker.rejected")
+        return CircuitOpenError(f"API Gemini indisponível, nova tentativa em {wait:.0f}s")
+
+    def before_request(self):
+        """Chamado antes de cada requisição; retorna True se ela for uma sonda"""
+        while True:
+            allowed, probe, wait = self._try_pass()
+            if allowed:
+                return probe
+            if self.mode != "park":
+                raise self._blocked(wait)
+            time.sleep(wait)
+
+    async def before_request_async(self):
+        """Versão assíncrona de before_request"""
+        while True:
+            allowed, probe, wait = self._try_pass()
+            if allowed:
+                return probe
+            if self.mode != "park":
+                raise self._blocked(wait)
+            await asyncio.sleep(wait)
+
+    def record(self, success, probe=False):
+        """Registra o resultado de uma requisição que passou pelo circuito"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if probe:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self._transition(CLOSED if success else OPEN)
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_requests
+                    and failures / len(self._outcomes) >= self.error_rate):
+                self._transition(OPEN)
+
+    def release_probe(self):
+        """Devolve a vaga de sonda de uma requisição cancelada, sem registrar resultado"""
+        with self._lock:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def status_text(self):
+        return STATE_LABELS[self.state]
+
+def is_failure(status_code):
+    """Erros de servidor e falhas de rede contam para o circuito; 429 é tratado pelo controle de taxa"""
+    return status_code is None or status_code >= 500
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+def get_circuit_breaker():
+    """Retorna o disjuntor compartilhado pelo processo"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker()
+    return _breaker
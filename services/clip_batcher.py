@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import base64
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from config.config import GEMINI_CONFIG
+from utils.metrics import metrics
+from .gemini_client import get_gemini_client
+from .retry import post_with_retries
+from .rate_limiter import AUDIO_TOKENS_PER_SECOND, estimate_audio_tokens
+
+BATCH_PROMPT = (
+    "Transcreva cada um dos áudios a seguir para texto em português brasileiro. "
+    "Cada áudio é precedido por um rótulo no formato [CLIPE n]. Responda com o "
+    "mesmo rótulo em uma linha própria seguido da transcrição daquele áudio, "
+    "na mesma ordem, sem comentários adicionais."
+)
+
+CLIP_LABEL = "[CLIPE {index}]"
+CLIP_LABEL_PATTERN = re.compile(r"^\s*\[CLIPE (\d+)\]\s*$", re.MULTILINE)
+
+def clip_duration(audio_file):
+    """Duração estimada do áudio em segundos, a partir do cabeçalho e do tamanho"""
+    with open(audio_file, "rb") as f:
+        header = f.read(44)
+    return estimate_audio_tokens(header, os.path.getsize(audio_file)) / AUDIO_TOKENS_PER_SECOND
+
+def demux_response(text, count):
+    """Separa a resposta rotulada em uma transcrição por clipe; None para rótulos ausentes"""
+    texts = [None] * count
+    matches = list(CLIP_LABEL_PATTERN.finditer(text or ""))
+    for position, match in enumerate(matches):
+        index = int(match.group(1)) - 1
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(text)
+        clip_text = text[match.end():end].strip()
+        if 0 <= index < count and clip_text:
+            texts[index] = clip_text
+    return texts
+
+class _Clip:
+    def __init__(self, audio_file, mime_type):
+        self.audio_file = audio_file
+        self.mime_type = mime_type
+        self.size = os.path.getsize(audio_file)
+        self.duration = clip_duration(audio_file)
+        self.arrived = time.monotonic()
+        self.future = Future()
+
+class ClipBatcher:
+    """
+    Junta áudios curtos enviados por jobs diferentes em uma única requisição
+    generateContent com vários trechos inlineData, cada um precedido de um
+    rótulo. Enquanto houver outros jobs em andamento que ainda podem enviar
+    clipes, o primeiro da fila espera até window_seconds por eles, respeitando
+    os limites de quantidade, bytes e duração do lote; um job sozinho é
+    enviado na hora. A resposta
+    é separada pelos rótulos e entregue ao Future de cada clipe; clipes sem
+    transcrição recebem None e o chamador faz a requisição individual.
+    """
+
+    def __init__(self):
+        settings = GEMINI_CONFIG["clip_batching"]
+        self.window_seconds = settings["window_seconds"]
+        self.max_source_seconds = settings["max_source_seconds"]
+        self.max_clips = settings["max_clips"]
+        self.max_clip_bytes = settings["max_clip_mb"] * 1024 * 1024
+        self.max_batch_bytes = settings["max_batch_mb"] * 1024 * 1024
+        self.max_batch_seconds = settings["max_batch_seconds"]
+
+        self._queue = []
+        self._active_jobs = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=GEMINI_CONFIG["max_workers"])
+
+    def accepts(self, audio_file, source_seconds):
+        """
+        Indica se o áudio pode ser agrupado. A decisão vem da duração da
+        entrada do job (source_seconds), não do tamanho de um chunk: um job
+        longo dividido em chunks pequenos nunca passa pelo agrupador.
+        """
+        if source_seconds > self.max_source_seconds:
+            return False
+        try:
+            size = os.path.getsize(audio_file)
+        except OSError:
+            return False
+        return size <= self.max_clip_bytes
+
+    def job_started(self):
+        """Registra um job em andamento, que pode enviar um clipe ao agrupador"""
+        with self._condition:
+            self._active_jobs += 1
+
+    def job_finished(self):
+        """Registra o fim de um job; o lote em espera não aguarda mais por ele"""
+        with self._condition:
+            self._active_jobs = max(0, self._active_jobs - 1)
+            self._condition.notify()
+
+    def _expects_more(self):
+        """Se vale esperar por outro clipe: o lote cabe mais um e há jobs que ainda não enviaram"""
+        return (self._batch_size() == len(self._queue)
+                and len(self._queue) < min(self.max_clips, self._active_jobs))
+
+    def submit(self, audio_file, mime_type):
+        """Enfileira um clipe; o Future recebe a transcrição (ou None)"""
+        clip = _Clip(audio_file, mime_type)
+        with self._condition:
+            self._queue.append(clip)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="clip-batcher", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return clip.future
+
+    def _batch_size(self):
+        """Quantos clipes do início da fila cabem em um lote (sempre pelo menos um)"""
+        count, size, duration = 0, 0, 0.0
+        for clip in self._queue:
+            if count and (count >= self.max_clips
+                          or size + clip.size > self.max_batch_bytes
+                          or duration + clip.duration > self.max_batch_seconds):
+                break
+            count += 1
+            size += clip.size
+            duration += clip.duration
+        return count
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                deadline = self._queue[0].arrived + self.window_seconds
+                while self._expects_more():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                count = self._batch_size()
+                batch, self._queue = self._queue[:count], self._queue[count:]
+            self._executor.submit(self._send, batch)
+
+    def _payload(self, batch):
+        parts = [{"text": BATCH_PROMPT}]
+        for index, clip in enumerate(batch, start=1):
+            with open(clip.audio_file, "rb") as f:
+                data = base64.b64encode(f.read()).decode("utf-8")
+            parts.append({"text": CLIP_LABEL.format(index=index)})
+            parts.append({"inlineData": {"mimeType": clip.mime_type, "data": data}})
+        return {"contents": [{"parts": parts}]}
+
+    def _send(self, batch):
+        texts = [None] * len(batch)
+        try:
+            texts = self._transcribe(batch)
+        except Exception as e:
+            logging.error(f"Erro no lote de {len(batch)} clipes: {e}")
+        finally:
+            for clip, text in zip(batch, texts):
+                clip.future.set_result(text)
+
+    def _transcribe(self, batch):
+        """Envia o lote com novas tentativas e separa a resposta por clipe"""
+        payload = self._payload(batch)
+        text = post_with_retries(lambda: get_gemini_client().post(payload), f"Lote de {len(batch)} clipes")
+        if text is None:
+            return [None] * len(batch)
+        texts = demux_response(text, len(batch))
+        missing = texts.count(None)
+        metrics.incr("clip_batching.batches")
+        metrics.incr("clip_batching.clips", len(batch))
+        metrics.incr("clip_batching.missing", missing)
+        logging.info(f"Lote de {len(batch)} clipes transcrito ({missing} sem rótulo na resposta)")
+        return texts
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_clip_batcher():
+    """Retorna o agrupador de clipes do processo, ou None se desativado"""
+    global _batcher
+    if not GEMINI_CONFIG["clip_batching"]["enabled"]:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = ClipBatcher()
+    return _batcher
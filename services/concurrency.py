@@ -0,0 +1,228 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from config.config import GEMINI_CONFIG
+from utils.metrics import metrics
+
+OVERLOAD_STATUS = (429, 503)
+# Percentil das latências recentes usado como linha de base
+BASELINE_PERCENTILE = 10
+
+def parse_retry_after(headers):
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos de espera"""
+    value = (headers or {}).get("Retry-After") or (headers or {}).get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_delay(response, retries):
+    """Tempo de espera antes de uma nova tentativa, respeitando Retry-After quando houver"""
+    if response is not None and response.status_code in OVERLOAD_STATUS:
+        # Importação local: o pool de chaves depende deste módulo
+        from .key_pool import get_key_pool
+        if get_key_pool().isolates(response.status_code):
+            # A próxima tentativa sai por outra chave; se todas estiverem em
+            # pausa, o próprio pool faz esperar até a primeira voltar
+            return 0
+        retry_after = parse_retry_after(response.headers)
+        if retry_after is not None:
+            return retry_after
+    return 2 ** retries
+
+class AdaptiveConcurrencyController:
+    """
+    Controla o número de requisições simultâneas à API no estilo AIMD:
+    aumenta o limite enquanto latência e taxa de erro estão saudáveis e
+    reduz multiplicativamente ao receber 429/503.
+    """
+
+    def __init__(self, initial=None, minimum=None, maximum=None):
+        settings = GEMINI_CONFIG["concurrency"]
+        self.minimum = minimum or settings["min"]
+        self.maximum = maximum or GEMINI_CONFIG["max_concurrency"]
+        self.limit = float(initial or GEMINI_CONFIG["max_workers"])
+        self.increase_step = settings["increase_step"]
+        self.decrease_factor = settings["decrease_factor"]
+        self.latency_tolerance = settings["latency_tolerance"]
+        self.max_error_rate = settings["max_error_rate"]
+
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        # Latências recentes por tipo de requisição (chunk de áudio, texto): a
+        # linha de base é o percentil 10 da janela, e não o mínimo histórico,
+        # para que uma resposta atipicamente rápida não trave o crescimento
+        self._latencies = {}
+        self._window = settings["window"]
+        self._outcomes = deque(maxlen=settings["window"])
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters = []
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge("concurrency.limit", int(self.limit))
+        metrics.set_gauge("concurrency.in_flight", self.in_flight)
+
+    def _try_acquire(self):
+        """Tenta ocupar uma vaga; retorna (conseguiu, segundos até poder tentar de novo)"""
+        wait = self.blocked_until - time.monotonic()
+        if wait > 0:
+            return False, wait
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._publish()
+            return True, 0
+        return False, None
+
+    def acquire(self):
+        """Aguarda uma vaga de forma bloqueante"""
+        with self._cond:
+            while True:
+                acquired, wait = self._try_acquire()
+                if acquired:
+                    return
+                self._cond.wait(wait)
+
+    def has_free_slot(self):
+        """Se uma nova requisição sairia agora, sem esperar vaga nem Retry-After"""
+        with self._lock:
+            return self.blocked_until <= time.monotonic() and self.in_flight < int(self.limit)
+
+    async def acquire_async(self):
+        """Aguarda uma vaga sem bloquear o loop de eventos"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                acquired, wait = self._try_acquire()
+                if acquired:
+                    return
+                waiter = (loop, asyncio.Event())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                # Um waiter cancelado não pode ficar preso a um loop que será fechado
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _notify(self):
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, event in waiters:
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # O loop fechou entre a verificação e o agendamento
+                pass
+
+    def _decrease(self, started_at, reason):
+        # Requisições que já estavam em voo antes da última redução não reduzem de novo
+        if started_at is not None and started_at < self.last_decrease:
+            return
+        self.last_decrease = time.monotonic()
+        self._set_limit(self.limit * self.decrease_factor, reason)
+
+    def _set_limit(self, new_limit, reason):
+        new_limit = min(self.maximum, max(self.minimum, new_limit))
+        if int(new_limit) != int(self.limit):
+            decision = "increase" if new_limit > self.limit else "decrease"
+            metrics.incr(f"concurrency.{decision}")
+            logging.info(f"Limite de concorrência: {int(self.limit)} -> {int(new_limit)} ({reason})")
+        self.limit = new_limit
+
+    def base_latency(self, kind=None):
+        """Linha de base de latência (percentil 10 das recentes) de um tipo de requisição"""
+        samples = sorted(self._latencies.get(kind, ()))
+        if not samples:
+            return None
+        return samples[int(round(BASELINE_PERCENTILE / 100 * (len(samples) - 1)))]
+
+    def release(self, status_code=None, latency=None, headers=None, cancelled=False, pause=True, kind=None):
+        """
+        Libera a vaga e ajusta o limite conforme o resultado da requisição.
+        Com pause=False o Retry-After não pausa as demais requisições (o pool
+        de chaves já tirou de uso só a chave que atingiu a cota). kind separa
+        as linhas de base de latência de requisições de tamanhos diferentes.
+        """
+        with self._lock:
+            # Só vale a pena crescer se o limite atual estava sendo usado por completo
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            started_at = time.monotonic() - latency if latency is not None else None
+
+            if cancelled:
+                # Requisição cancelada pelo chamador (ex.: hedge perdedor) não é sinal de saúde
+                pass
+            elif status_code in OVERLOAD_STATUS:
+                self._outcomes.append(False)
+                metrics.incr(f"concurrency.status_{status_code}")
+                self._decrease(started_at, f"HTTP {status_code}")
+                retry_after = parse_retry_after(headers) if pause else None
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                    logging.info(f"Novas requisições pausadas por {retry_after:.1f}s (Retry-After)")
+            elif status_code == 200:
+                self._outcomes.append(True)
+                if latency is not None:
+                    samples = self._latencies.setdefault(kind, deque(maxlen=self._window))
+                    samples.append(latency)
+                    healthy_latency = latency <= self.base_latency(kind) * self.latency_tolerance
+                else:
+                    healthy_latency = True
+                if saturated and healthy_latency and self.error_rate() <= self.max_error_rate:
+                    # Incremento aditivo de ~1 vaga a cada janela completa de sucessos
+                    self._set_limit(self.limit + self.increase_step / max(self.limit, 1), "saudável")
+            else:
+                self._outcomes.append(False)
+                if self.error_rate() > self.max_error_rate:
+                    self._decrease(started_at, "taxa de erro alta")
+
+            self._publish()
+            self._notify()
+
+    def error_rate(self):
+        """Fração de falhas entre os resultados mais recentes"""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def get_metrics(self):
+        """Estado atual do controlador"""
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "error_rate": self.error_rate(),
+                "base_latency": {kind: self.base_latency(kind) for kind in self._latencies},
+                "blocked_for": max(0.0, self.blocked_until - time.monotonic()),
+                "increases": metrics.get("concurrency.increase"),
+                "decreases": metrics.get("concurrency.decrease"),
+            }
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_concurrency_controller():
+    """Retorna o controlador de concorrência compartilhado pelo processo"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdaptiveConcurrencyController()
+    return _controller
@@ -0,0 +1,265 @@
+import json
+import time
+import asyncio
+import threading
+import logging
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from config.config import GEMINI_API_URL, GEMINI_CONFIG
+from .concurrency import get_concurrency_controller
+from .rate_limiter import get_rate_limiter, estimate_tokens
+from .circuit_breaker import get_circuit_breaker, is_failure
+from .key_pool import get_key_pool, credential_headers
+from utils.metrics import metrics
+
+def _request_args(payload, credential):
+    """Monta headers e corpo; payloads em streaming são enviados em blocos com Content-Length"""
+    # A chave vem da credencial escolhida para esta requisição, não de um dict global
+    headers = credential_headers(credential)
+    if isinstance(payload, dict):
+        return headers, {"json": payload}
+    headers["Content-Length"] = str(len(payload))
+    return headers, {"data": payload}
+
+def request_kind(payload):
+    """Tipo da requisição para o controle de concorrência: com áudio ou só texto"""
+    if not isinstance(payload, dict):
+        return "audio"
+    parts = [part for content in payload.get("contents", []) for part in content.get("parts", [])]
+    return "text" if all("text" in part for part in parts) else "audio"
+
+def stream_url(url):
+    """URL de streamGenerateContent (eventos SSE) equivalente a uma URL generateContent"""
+    url = url.replace(":generateContent", ":streamGenerateContent")
+    return url + ("&" if "?" in url else "?") + "alt=sse"
+
+def iter_sse_events(lines):
+    """Interpreta as linhas de uma resposta SSE e produz o JSON de cada evento"""
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r")
+        if line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and data:
+            yield json.loads("\n".join(data))
+            data = []
+    if data:
+        yield json.loads("\n".join(data))
+
+def _event_text(event):
+    """Texto de um evento do streaming; eventos finais podem vir sem partes"""
+    candidates = event.get("candidates") or [{}]
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+class GeminiClient:
+    """Cliente HTTP compartilhado para a API Gemini com pool de conexões keep-alive"""
+
+    def __init__(self, pool_size=None):
+        # O pool acompanha o teto do controle adaptativo de concorrência
+        self.pool_size = pool_size or GEMINI_CONFIG["max_concurrency"]
+        self.session = requests.Session()
+        # Mantém as conexões abertas entre chunks para evitar novos handshakes TCP+TLS
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=True
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, payload, url=GEMINI_API_URL, timeout=None, on_text=None):
+        """
+        Envia uma requisição generateContent reaproveitando as conexões do pool.
+        Com on_text, usa streamGenerateContent e repassa cada trecho de texto
+        assim que chega; a resposta devolvida tem o texto completo.
+        """
+        breaker = get_circuit_breaker()
+        probe = breaker.before_request()
+        key_pool = get_key_pool()
+        controller = get_concurrency_controller()
+        credential = None
+        acquired = False
+        sent = False
+        response = None
+        # Tudo depois de obter a vaga no circuito fica dentro do try: uma sonda
+        # interrompida antes do envio precisa devolver a vaga
+        try:
+            credential, wait = key_pool.choose(url, payload)
+            if wait > 0:
+                time.sleep(wait)
+            get_rate_limiter(url, credential and credential.key_id).acquire(estimate_tokens(payload))
+            controller.acquire()
+            acquired = True
+            headers, body = _request_args(payload, credential)
+            start = time.monotonic()
+            sent = True
+            if on_text and GEMINI_CONFIG["streaming"]["enabled"]:
+                response = self._post_stream(url, headers, body, timeout, on_text)
+            else:
+                response = self.session.post(
+                    url,
+                    headers=headers,
+                    timeout=timeout or GEMINI_CONFIG["timeout"],
+                    **body
+                )
+            return response
+        finally:
+            status_code = response.status_code if response is not None else None
+            response_headers = response.headers if response is not None else None
+            if acquired:
+                controller.release(
+                    status_code,
+                    time.monotonic() - start if sent else 0,
+                    response_headers,
+                    cancelled=not sent,
+                    pause=not key_pool.isolates(status_code),
+                    kind=request_kind(payload)
+                )
+            if sent:
+                key_pool.report(credential, status_code, response_headers)
+                breaker.record(not is_failure(status_code), probe)
+            elif probe:
+                breaker.release_probe()
+
+    def _post_stream(self, url, headers, body, timeout, on_text):
+        """Lê a resposta SSE evento a evento e monta uma resposta equivalente à de generateContent"""
+        start = time.monotonic()
+        with self.session.post(
+            stream_url(url),
+            headers=headers,
+            timeout=timeout or GEMINI_CONFIG["timeout"],
+            stream=True,
+            **body
+        ) as response:
+            if response.status_code != 200:
+                return GeminiResponse(response.status_code, response.text, response.headers)
+            texts = []
+            for event in iter_sse_events(response.iter_lines()):
+                text = _event_text(event)
+                if not text:
+                    continue
+                if not texts:
+                    metrics.set_gauge("streaming.first_text_seconds", round(time.monotonic() - start, 3))
+                texts.append(text)
+                on_text(text)
+            result = {"candidates": [{"content": {"parts": [{"text": "".join(texts)}], "role": "model"}}]}
+            return GeminiResponse(200, json.dumps(result), response.headers)
+
+    def close(self):
+        """Fecha as conexões abertas do pool"""
+        self.session.close()
+
+class GeminiResponse:
+    """Resposta HTTP já lida, com a mesma interface usada de requests.Response"""
+
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.text)
+
+class AsyncGeminiClient:
+    """Cliente HTTP assíncrono para a API Gemini, usado pelo motor de transcrição"""
+
+    def __init__(self, max_connections=None):
+        self.max_connections = max_connections or GEMINI_CONFIG["max_concurrency"]
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def post(self, payload, url=GEMINI_API_URL, timeout=None, rate_limited=True, credential=None, on_sent=None):
+        """
+        Envia uma requisição generateContent e devolve a resposta já lida.
+        Use rate_limited=False, informando a credencial, quando a cota já foi
+        reservada pelo chamador no limitador daquela chave. on_sent é chamado
+        quando a requisição sai, depois das esperas por circuito, chave, cota
+        e vaga de concorrência.
+        """
+        breaker = get_circuit_breaker()
+        probe = await breaker.before_request_async()
+        key_pool = get_key_pool()
+        controller = get_concurrency_controller()
+        acquired = False
+        sent = False
+        cancelled = False
+        result = None
+        # Tudo depois de obter a vaga no circuito fica dentro do try: uma sonda
+        # cancelada esperando a chave, o limitador ou o controle devolve a vaga
+        try:
+            if credential is None:
+                credential, wait = key_pool.choose(url, payload)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            if rate_limited:
+                await get_rate_limiter(url, credential and credential.key_id).acquire_async(estimate_tokens(payload))
+            await controller.acquire_async()
+            acquired = True
+            headers, body = _request_args(payload, credential)
+            start = time.monotonic()
+            sent = True
+            if on_sent:
+                on_sent()
+            async with self.session.post(
+                url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout or GEMINI_CONFIG["timeout"]),
+                **body
+            ) as response:
+                result = GeminiResponse(response.status, await response.text(), dict(response.headers))
+                return result
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            status_code = result.status_code if result is not None else None
+            if acquired:
+                controller.release(
+                    status_code,
+                    time.monotonic() - start if sent else 0,
+                    result.headers if result is not None else None,
+                    cancelled or not sent,
+                    pause=not key_pool.isolates(status_code),
+                    kind=request_kind(payload)
+                )
+            if sent and not cancelled:
+                key_pool.report(credential, status_code, result.headers if result is not None else None)
+                breaker.record(not is_failure(status_code), probe)
+            elif probe:
+                breaker.release_probe()
+
+    async def close(self):
+        """Fecha a sessão e as conexões abertas"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_gemini_client():
+    """Retorna a instância única do cliente Gemini, criando-a se necessário"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+                logging.info(f"Cliente Gemini criado com pool de {_client.pool_size} conexões")
+    return _client
+
+def extract_text(result):
+    """Extrai o texto da primeira candidata de uma resposta generateContent"""
+    if "candidates" in result and result["candidates"]:
+        return result["candidates"][0]["content"]["parts"][0]["text"]
+    return None
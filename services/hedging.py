@@ -0,0 +1,104 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from config.config import GEMINI_API_URL, GEMINI_CONFIG
+from utils.metrics import metrics
+from .rate_limiter import get_rate_limiter, estimate_tokens
+from .key_pool import get_key_pool
+from .concurrency import get_concurrency_controller
+
+class LatencyTracker:
+    """Latências recentes de chunks bem-sucedidos, compartilhadas entre jobs do processo"""
+
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percentile, min_samples):
+        """Percentil das latências recentes, ou None se ainda não há amostras suficientes"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            samples = sorted(self._samples)
+        position = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[position]
+
+_tracker = LatencyTracker(GEMINI_CONFIG["hedging"]["window"])
+
+def _is_success(task):
+    return not task.cancelled() and task.exception() is None and task.result().status_code == 200
+
+async def hedged_post(client, payload, stats, label, url=GEMINI_API_URL):
+    """
+    Envia o payload e, se a resposta demorar mais que o percentil configurado
+    das latências recentes, dispara uma cópia. A primeira resposta bem-sucedida
+    vence e a outra é cancelada. A cópia só sai se o limitador de taxa tiver
+    cota e o controle de concorrência uma vaga livre no momento, para não
+    competir com as demais requisições.
+    """
+    settings = GEMINI_CONFIG["hedging"]
+    # O prazo e a latência registrada contam a partir do envio: o tempo na fila
+    # do circuito, da cota e do controle de concorrência não é lentidão da API
+    sent = asyncio.Event()
+    sent_at = []
+
+    def on_sent():
+        sent_at.append(time.monotonic())
+        sent.set()
+
+    primary = asyncio.ensure_future(client.post(payload, url, on_sent=on_sent))
+    threshold = None
+    if settings["enabled"]:
+        threshold = _tracker.percentile(settings["percentile"], settings["min_samples"])
+
+    tasks = {primary}
+    if threshold is not None:
+        sending = asyncio.ensure_future(sent.wait())
+        try:
+            await asyncio.wait({primary, sending}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sending.cancel()
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            credential, wait = get_key_pool().choose(url, payload)
+            limiter = get_rate_limiter(url, credential and credential.key_id)
+            if (wait <= 0 and get_concurrency_controller().has_free_slot()
+                    and limiter.try_acquire(estimate_tokens(payload))):
+                logging.info(f"{label}: sem resposta após {threshold:.1f}s, enviando requisição duplicada")
+                stats["hedges_fired"] += 1
+                metrics.incr("hedging.fired")
+                tasks.add(asyncio.ensure_future(
+                    client.post(payload, url, rate_limited=False, credential=credential)
+                ))
+            else:
+                stats["hedges_skipped"] += 1
+                metrics.incr("hedging.skipped")
+
+    hedge = next((task for task in tasks if task is not primary), None)
+    finished = None
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if _is_success(task)]
+            if winners:
+                finished = winners[0]
+                break
+            finished = next(iter(done))
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    if _is_success(finished) and sent_at:
+        _tracker.record(time.monotonic() - sent_at[0])
+        if finished is hedge:
+            stats["hedges_won"] += 1
+            metrics.incr("hedging.won")
+    return finished.result()
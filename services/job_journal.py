@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from config.config import GEMINI_CONFIG, STATE_DIR
+from utils.file_lock import FileLock
+
+JOBS_DIR = STATE_DIR / "jobs"
+
+CHUNK_PENDING = "pending"
+CHUNK_DONE = "done"
+CHUNK_FAILED = "failed"
+
+JOB_RUNNING = "running"
+JOB_FAILED = "failed"
+JOB_DONE = "done"
+
+def job_id_for(audio_file):
+    """Identificador do job a partir do caminho, tamanho e data de modificação do áudio"""
+    stat = os.stat(audio_file)
+    identity = f"{os.path.abspath(audio_file)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+
+def file_hash(path):
+    """SHA-256 do conteúdo de um arquivo"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class JobJournal:
+    """
+    Manifesto em disco de um job de transcrição: plano de chunks, hash e status
+    de cada chunk e o texto já transcrito. Fica fora de OUTPUT_DIR para sobreviver
+    a clear_output_directory e permitir retomar apenas o que falta. Um job
+    concluído é apagado: reaproveitar transcrições prontas é papel do cache
+    de transcrições, que considera prompt, modelo e formato do chunk.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.directory = JOBS_DIR / job_id
+        self.chunk_dir = self.directory / "chunks"
+        self.manifest_file = self.directory / "manifest.json"
+        self._lock = FileLock(str(self.directory / "manifest.lock"))
+        self.manifest = None
+
+    @classmethod
+    def open(cls, job_id):
+        """Abre um job existente; retorna None se não houver manifesto"""
+        journal = cls(job_id)
+        if not journal.manifest_file.exists():
+            return None
+        journal.manifest = json.loads(journal.manifest_file.read_text(encoding="utf-8"))
+        return journal
+
+    @classmethod
+    def open_or_create(cls, audio_file):
+        """
+        Abre o job inacabado do áudio informado, ou cria um manifesto vazio se
+        não houver um. Manifestos de jobs concluídos não são retomados.
+        """
+        job_id = job_id_for(audio_file)
+        journal = cls.open(job_id)
+        if journal and journal.manifest["status"] != JOB_DONE:
+            logging.info(f"Retomando job {job_id}")
+            return journal
+        if journal:
+            journal.discard()
+        journal = cls(job_id)
+        journal.manifest = {
+            "job_id": job_id,
+            "audio_file": os.path.abspath(audio_file),
+            "status": JOB_RUNNING,
+            "created": time.time(),
+            "updated": time.time(),
+            "chunks": [],
+        }
+        journal.save()
+        return journal
+
+    def save(self):
+        """Grava o manifesto de forma atômica"""
+        self.manifest["updated"] = time.time()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tmp_file = self.manifest_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_file, self.manifest_file)
+
+    @property
+    def audio_file(self):
+        return self.manifest["audio_file"]
+
+    @property
+    def chunks(self):
+        return self.manifest["chunks"]
+
+    def has_plan(self):
+        """Indica se o plano de chunks foi gravado e todos os chunks ainda estão em disco"""
+        if not self.chunks:
+            return False
+        return all(
+            chunk["status"] == CHUNK_DONE or os.path.exists(chunk["path"])
+            for chunk in self.chunks
+        )
+
+    def set_plan(self, chunks, non_speech=None):
+        """
+        Registra o plano de chunks já extraídos, com o hash de cada um, e o
+        relatório da remoção de trechos sem fala, se houve
+        """
+        if non_speech:
+            self.manifest["non_speech"] = non_speech
+        self.manifest["chunks"] = [{
+            **chunk,
+            "hash": file_hash(chunk["path"]),
+            "status": CHUNK_PENDING,
+            "text": None,
+        } for chunk in chunks]
+        self.save()
+
+    def pending_chunks(self):
+        """Chunks ainda não transcritos (pendentes ou que falharam)"""
+        return [chunk for chunk in self.chunks if chunk["status"] != CHUNK_DONE]
+
+    def mark_chunk(self, index, text):
+        """Registra o resultado de um chunk; texto vazio marca falha"""
+        chunk = self.chunks[index]
+        chunk["status"] = CHUNK_DONE if text else CHUNK_FAILED
+        chunk["text"] = text
+        self.save()
+
+    def texts(self):
+        """Textos dos chunks na ordem do plano, com None nos que não foram concluídos"""
+        return [chunk["text"] if chunk["status"] == CHUNK_DONE else None for chunk in self.chunks]
+
+    def finish(self):
+        """
+        Atualiza o status do job; quando tudo foi transcrito, apaga o job do
+        disco (os textos continuam disponíveis neste objeto)
+        """
+        if self.pending_chunks():
+            self.manifest["status"] = JOB_FAILED
+            self.save()
+        else:
+            self.manifest["status"] = JOB_DONE
+            self.discard()
+
+    def discard(self):
+        """Remove o manifesto e os chunks de áudio do job"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def summary(self):
+        done = len(self.chunks) - len(self.pending_chunks())
+        return f"{os.path.basename(self.audio_file)} ({done}/{len(self.chunks)} chunks)"
+
+def list_incomplete_jobs():
+    """Jobs interrompidos ou com chunks que falharam, do mais recente ao mais antigo"""
+    jobs = []
+    if not JOBS_DIR.exists():
+        return jobs
+    for manifest_file in JOBS_DIR.glob("*/manifest.json"):
+        journal = JobJournal.open(manifest_file.parent.name)
+        if journal and journal.manifest["status"] != JOB_DONE:
+            jobs.append(journal)
+    return sorted(jobs, key=lambda job: job.manifest["updated"], reverse=True)
+
+def journal_enabled():
+    return GEMINI_CONFIG["journal"]["enabled"]
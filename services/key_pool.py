@@ -0,0 +1,127 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+import config.config as app_config
+from config.config import GEMINI_CONFIG
+from utils.metrics import metrics
+from .rate_limiter import get_rate_limiter
+from .concurrency import parse_retry_after
+
+try:
+    import config_manager
+except ImportError:  # cryptography não instalado: o pool usa só a chave da configuração do usuário
+    config_manager = None
+
+# Credencial imutável de uma requisição: a chave escolhida no início vale até o fim,
+# mesmo que a configuração mude no meio do job
+Credential = namedtuple("Credential", ["key_id", "api_key"])
+
+def make_credential(api_key):
+    """Credencial com um identificador estável que não expõe a chave nos logs e nos limitadores"""
+    return Credential(hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8], api_key)
+
+def credential_headers(credential):
+    """Headers de uma requisição com a chave da credencial, sem tocar em GEMINI_CONFIG"""
+    headers = dict(GEMINI_CONFIG["headers"])
+    if credential:
+        headers["x-goog-api-key"] = credential.api_key
+    return headers
+
+def load_api_keys():
+    """
+    Chaves disponíveis: GEMINI_API_KEYS e GEMINI_API_KEY do armazenamento
+    criptografado do ConfigManager, seguidas da chave da configuração do usuário.
+    """
+    keys = []
+    if config_manager is not None:
+        store_file = os.path.join(os.path.dirname(config_manager.__file__), ".config.enc")
+        # Só instancia o ConfigManager se houver armazenamento; ele cria a chave de criptografia
+        if os.path.exists(store_file):
+            stored = config_manager.ConfigManager().load_config()
+            keys.extend(stored.get("GEMINI_API_KEYS") or [])
+            keys.append(stored.get("GEMINI_API_KEY"))
+    keys.append(app_config.GEMINI_API_KEY)
+    return list(dict.fromkeys(key for key in keys if key))
+
+# Dono de cada arquivo enviado pela API de arquivos: a URI só vale para a chave que enviou
+_file_owners = {}
+
+def register_file_owner(file_uri, key_id):
+    _file_owners[file_uri] = key_id
+
+def _pinned_key_id(payload):
+    """Chave exigida pelo payload quando ele referencia arquivos da API de arquivos"""
+    if not isinstance(payload, dict):
+        return None
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            if "fileData" in part and part["fileData"]["fileUri"] in _file_owners:
+                return _file_owners[part["fileData"]["fileUri"]]
+    return None
+
+class KeyPool:
+    """
+    Pool de chaves da API Gemini. Cada requisição recebe a chave com mais cota
+    restante no limitador de taxa daquele modelo; chaves que recebem 429 ficam
+    em pausa pelo Retry-After (ou bench_seconds) e voltam depois.
+    """
+
+    def __init__(self, api_keys):
+        self.credentials = [make_credential(key) for key in api_keys]
+        self._benched_until = {}
+        self._lock = threading.Lock()
+        logging.info(f"Pool de chaves da API com {len(self.credentials)} chave(s)")
+
+    def choose(self, url, payload=None):
+        """Retorna (credencial, segundos de espera); a espera só é positiva se todas as chaves estão em pausa"""
+        if not self.credentials:
+            return None, 0
+        pinned = _pinned_key_id(payload)
+        candidates = [c for c in self.credentials if c.key_id == pinned] or self.credentials
+        now = time.monotonic()
+        with self._lock:
+            active = [c for c in candidates if self._benched_until.get(c.key_id, 0) <= now]
+            if not active:
+                credential = min(candidates, key=lambda c: self._benched_until[c.key_id])
+                return credential, self._benched_until[credential.key_id] - now
+        if len(active) == 1:
+            return active[0], 0
+        return max(active, key=lambda c: get_rate_limiter(url, c.key_id).available()), 0
+
+    def isolates(self, status_code):
+        """Indica se o pool contorna o erro sozinho: 429 de uma chave com outras disponíveis"""
+        return status_code == 429 and len(self.credentials) > 1
+
+    def report(self, credential, status_code, headers=None):
+        """Registra o resultado de uma requisição; 429 coloca a chave em pausa"""
+        if credential is None or status_code != 429:
+            return
+        seconds = parse_retry_after(headers)
+        if seconds is None:
+            seconds = GEMINI_CONFIG["key_pool"]["bench_seconds"]
+        with self._lock:
+            self._benched_until[credential.key_id] = time.monotonic() + seconds
+        metrics.incr("key_pool.benched")
+        logging.warning(f"Chave {credential.key_id} atingiu a cota, em pausa por {seconds:.0f}s")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_key_pool():
+    """Retorna o pool de chaves do processo"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KeyPool(load_api_keys())
+    return _pool
+
+def reload_key_pool():
+    """Recarrega as chaves após uma alteração; requisições em andamento mantêm sua credencial"""
+    global _pool
+    with _pool_lock:
+        _pool = KeyPool(load_api_keys())
+    return _pool
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from config.config import GEMINI_API_URL, GEMINI_UPLOAD_URL, GEMINI_CONFIG, STATE_DIR
+from utils.file_lock import FileLock
+from .gemini_client import get_gemini_client
+from .payload import StreamingAudioPayload
+from .rate_limiter import register_file_tokens
+from .key_pool import get_key_pool, register_file_owner
+
+UPLOADS_FILE = STATE_DIR / "uploads.json"
+UPLOADS_LOCK = STATE_DIR / "uploads.lock"
+
+class UploadError(Exception):
+    """Falha no upload resumível para a API de arquivos"""
+
+def _file_hash(audio_file):
+    digest = hashlib.sha256()
+    with open(audio_file, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _load_uploads():
+    try:
+        return json.loads(UPLOADS_FILE.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_uploads(uploads):
+    now = time.time()
+    uploads = {key: entry for key, entry in uploads.items() if entry["expires"] > now}
+    tmp_file = UPLOADS_FILE.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(uploads))
+    os.replace(tmp_file, UPLOADS_FILE)
+
+class MediaUploader:
+    """
+    Envia áudios uma única vez pelo protocolo de upload resumível da API de
+    arquivos e guarda a URI resultante, reaproveitada por novas tentativas,
+    pelas etapas seguintes e por execuções posteriores enquanto não expira.
+    """
+
+    def __init__(self, upload_url=GEMINI_UPLOAD_URL):
+        self.upload_url = upload_url
+        self.session = get_gemini_client().session
+        # Os arquivos pertencem ao projeto da chave que os enviou; as requisições
+        # que usarem a URI são feitas com a mesma chave
+        self.credential, _ = get_key_pool().choose(GEMINI_API_URL)
+
+    def _headers(self, **extra):
+        headers = {"x-goog-api-key": self.credential.api_key if self.credential else ""}
+        headers.update(extra)
+        return headers
+
+    def _start_session(self, audio_file, mime_type, size):
+        response = self.session.post(
+            self.upload_url,
+            headers=self._headers(**{
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(size),
+                "X-Goog-Upload-Header-Content-Type": mime_type,
+                "Content-Type": "application/json",
+            }),
+            json={"file": {"display_name": os.path.basename(audio_file)}},
+            timeout=GEMINI_CONFIG["timeout"]
+        )
+        session_url = response.headers.get("X-Goog-Upload-URL")
+        if response.status_code != 200 or not session_url:
+            raise UploadError(f"Falha ao iniciar upload: {response.status_code} {response.text}")
+        return session_url
+
+    def _query_offset(self, session_url):
+        """Pergunta ao servidor quantos bytes já foram recebidos"""
+        response = self.session.post(
+            session_url,
+            headers=self._headers(**{"X-Goog-Upload-Command": "query"}),
+            timeout=GEMINI_CONFIG["timeout"]
+        )
+        if response.headers.get("X-Goog-Upload-Status") == "final":
+            return None, response
+        return int(response.headers.get("X-Goog-Upload-Size-Received", 0)), response
+
+    def _send(self, session_url, audio_file, size):
+        """Envia o arquivo, retomando do último byte confirmado em caso de falha"""
+        offset = 0
+        last_error = None
+        for attempt in range(GEMINI_CONFIG["max_retries"]):
+            try:
+                with open(audio_file, "rb") as f:
+                    f.seek(offset)
+                    response = self.session.post(
+                        session_url,
+                        headers=self._headers(**{
+                            "Content-Length": str(size - offset),
+                            "X-Goog-Upload-Offset": str(offset),
+                            "X-Goog-Upload-Command": "upload, finalize",
+                        }),
+                        data=f,
+                        timeout=GEMINI_CONFIG["timeout"]
+                    )
+                if response.status_code == 200:
+                    return response.json()["file"]
+                last_error = f"{response.status_code} {response.text}"
+            except Exception as e:
+                last_error = str(e)
+
+            logging.warning(f"Upload interrompido ({last_error}), retomando")
+            time.sleep(2 ** attempt)
+            try:
+                offset, response = self._query_offset(session_url)
+                if offset is None:
+                    return response.json()["file"]
+            except Exception as e:
+                last_error = str(e)
+        raise UploadError(f"Falha no upload após {GEMINI_CONFIG['max_retries']} tentativas: {last_error}")
+
+    def _wait_active(self, file_info):
+        """Aguarda o processamento do arquivo no servidor, se necessário"""
+        base_url = self.upload_url.split("/upload/")[0]
+        while file_info.get("state") == "PROCESSING":
+            time.sleep(1)
+            response = self.session.get(
+                f"{base_url}/v1beta/{file_info['name']}",
+                headers=self._headers(),
+                timeout=GEMINI_CONFIG["timeout"]
+            )
+            file_info = response.json()
+        if file_info.get("state") == "FAILED":
+            raise UploadError(f"Processamento do arquivo falhou: {file_info.get('name')}")
+        return file_info
+
+    def upload(self, audio_file, mime_type):
+        """Retorna a URI do áudio na API de arquivos, enviando-o apenas se ainda não estiver lá"""
+        key_id = self.credential.key_id if self.credential else ""
+        key = hashlib.sha256(f"{_file_hash(audio_file)}\0{mime_type}\0{self.upload_url}\0{key_id}".encode()).hexdigest()
+        with FileLock(str(UPLOADS_LOCK)):
+            entry = _load_uploads().get(key)
+        if entry and entry["expires"] > time.time():
+            register_file_tokens(entry["uri"], entry["tokens"])
+            register_file_owner(entry["uri"], key_id)
+            return entry["uri"]
+
+        size = os.path.getsize(audio_file)
+        session_url = self._start_session(audio_file, mime_type, size)
+        file_info = self._wait_active(self._send(session_url, audio_file, size))
+        logging.info(f"Áudio enviado para a API de arquivos: {file_info['uri']}")
+
+        tokens = StreamingAudioPayload("", audio_file, mime_type).estimated_tokens()
+        register_file_tokens(file_info["uri"], tokens)
+        register_file_owner(file_info["uri"], key_id)
+        with FileLock(str(UPLOADS_LOCK)):
+            uploads = _load_uploads()
+            uploads[key] = {
+                "uri": file_info["uri"],
+                "tokens": tokens,
+                "expires": time.time() + GEMINI_CONFIG["file_uri_ttl_hours"] * 3600,
+            }
+            _save_uploads(uploads)
+        return file_info["uri"]
+
+def build_audio_payload(prompt, audio_file, mime_type, generation_config=None):
+    """Monta o payload de transcrição conforme GEMINI_CONFIG['upload_mode']"""
+    if GEMINI_CONFIG["upload_mode"] == "files":
+        try:
+            file_uri = MediaUploader().upload(audio_file, mime_type)
+            payload = {
+                "contents": [{
+                    "parts": [{
+                        "text": prompt
+                    }, {
+                        "fileData": {
+                            "mimeType": mime_type,
+                            "fileUri": file_uri
+                        }
+                    }]
+                }]
+            }
+            if generation_config:
+                payload["generationConfig"] = generation_config
+            return payload
+        except Exception as e:
+            logging.warning(f"Upload pela API de arquivos falhou, enviando inline: {e}")
+    return StreamingAudioPayload(prompt, audio_file, mime_type, generation_config=generation_config)
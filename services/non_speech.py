@@ -0,0 +1,153 @@
+import os
+import logging
+import tempfile
+import itertools
+import subprocess
+from bisect import bisect_right
+from config.config import GEMINI_CONFIG
+from utils.metrics import metrics
+from utils.audio_processing import ENERGY_FRAME_MS, energy_profile, export_format, output_bytes_per_ms
+
+try:
+    import numpy as np
+except ImportError:  # numpy não instalado: o áudio é enviado sem remover trechos
+    np = None
+
+class TimeMap:
+    """
+    Relaciona posições do áudio condensado com o original. segments são os
+    trechos mantidos, em ordem, como (início no original em ms, duração em ms).
+    """
+
+    def __init__(self, segments):
+        self.segments = [tuple(segment) for segment in segments]
+        durations = [duration for _, duration in self.segments]
+        self._starts = list(itertools.accumulate([0] + durations))[:-1]
+
+    @property
+    def kept_ms(self):
+        return sum(duration for _, duration in self.segments)
+
+    def to_original(self, condensed_ms):
+        """Posição no áudio original correspondente a condensed_ms do áudio condensado"""
+        index = max(0, bisect_right(self._starts, condensed_ms) - 1)
+        start, duration = self.segments[index]
+        return start + min(condensed_ms - self._starts[index], duration)
+
+def non_speech_enabled():
+    if not GEMINI_CONFIG["non_speech"]["enabled"]:
+        return False
+    if np is None:
+        logging.warning("numpy não instalado, remoção de trechos sem fala desativada")
+        return False
+    return True
+
+def _moving_average(values, width):
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode="edge")
+    return np.convolve(padded, np.ones(width) / width, mode="valid")
+
+def non_speech_mask(energy, frame_ms=ENERGY_FRAME_MS):
+    """
+    Quadros sem fala: silêncio, até silence_margin_db acima do ruído de fundo
+    (percentil 5 da energia), ou som de energia quase constante, como música
+    de espera. A fala alterna sílabas e pausas curtas e varia bem mais.
+    """
+    settings = GEMINI_CONFIG["non_speech"]
+    silent = energy <= np.percentile(energy, 5) + settings["silence_margin_db"]
+
+    width = max(2, int(settings["steady_window_seconds"] * 1000) // frame_ms)
+    mean = _moving_average(energy, width)
+    variance = np.maximum(_moving_average(energy * energy, width) - mean * mean, 0)
+    steady = np.sqrt(variance) < settings["steady_std_db"]
+    return silent | steady
+
+def speech_segments(energy, duration_ms, frame_ms=ENERGY_FRAME_MS):
+    """
+    Trechos a manter (início, duração) em ms: tudo menos os trechos sem fala
+    de pelo menos min_span_seconds, que perdem padding_seconds de cada lado.
+    """
+    settings = GEMINI_CONFIG["non_speech"]
+    mask = non_speech_mask(energy, frame_ms)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    min_frames = int(settings["min_span_seconds"] * 1000) // frame_ms
+    padding_ms = int(settings["padding_seconds"] * 1000)
+
+    segments = []
+    position = 0
+    for first, last in edges.reshape(-1, 2):
+        if last - first < min_frames:
+            continue
+        removed_start = int(first) * frame_ms + padding_ms
+        removed_end = min(int(last) * frame_ms - padding_ms, duration_ms)
+        if removed_start > position:
+            segments.append((position, removed_start - position))
+        position = max(position, removed_end)
+    if position < duration_ms:
+        segments.append((position, duration_ms - position))
+    return segments
+
+def ffmpeg_condense_args(input_file, output_file, segments, fmt):
+    """Comando ffmpeg que junta só os trechos mantidos em um WAV, na taxa e nos canais de exportação"""
+    selection = "+".join(
+        f"between(t,{start / 1000:.3f},{(start + duration) / 1000:.3f})" for start, duration in segments
+    )
+    args = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', input_file,
+        '-vn', '-af', f"aselect='{selection}',asetpts=N/SR/TB",
+        '-acodec', 'pcm_s16le'
+    ]
+    if fmt["sample_rate"]:
+        args += ['-ar', str(fmt["sample_rate"])]
+    if fmt["channels"]:
+        args += ['-ac', str(fmt["channels"])]
+    args.append(output_file)
+    return args
+
+def condense_audio(input_file, info, output_dir):
+    """
+    Remove os trechos longos sem fala antes da divisão. Retorna (áudio
+    condensado, TimeMap, relatório) ou None se não houver o que remover ou em
+    caso de erro; nesse caso o chamador segue com o áudio original.
+    """
+    energy = energy_profile(input_file)
+    if energy is None or not len(energy):
+        return None
+    duration_ms = info["duration_ms"]
+    time_map = TimeMap(speech_segments(energy, duration_ms))
+    removed_ms = duration_ms - time_map.kept_ms
+    if not removed_ms:
+        logging.info("Nenhum trecho longo sem fala encontrado")
+        return None
+    if not time_map.segments:
+        logging.warning("Nenhum trecho com fala encontrado, enviando o áudio completo")
+        return None
+
+    fmt = export_format(info)
+    os.makedirs(output_dir, exist_ok=True)
+    # Nome único por job: sem o journal, output_dir é o OUTPUT_DIR compartilhado
+    fd, output_file = tempfile.mkstemp(prefix="condensed_", suffix=".wav", dir=output_dir)
+    os.close(fd)
+    result = subprocess.run(
+        ffmpeg_condense_args(input_file, output_file, time_map.segments, fmt),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        logging.error(f"Erro ao remover trechos sem fala: {result.stderr}")
+        os.remove(output_file)
+        return None
+
+    # Bytes estimados pelo formato de exportação: é o que deixa de ser enviado
+    bytes_per_ms = output_bytes_per_ms(fmt) or os.path.getsize(input_file) / duration_ms
+    report = {
+        "seconds_total": round(duration_ms / 1000, 1),
+        "seconds_removed": round(removed_ms / 1000, 1),
+        "bytes_saved": int(removed_ms * bytes_per_ms),
+    }
+    metrics.incr("non_speech.seconds_removed", report["seconds_removed"])
+    metrics.incr("non_speech.bytes_saved", report["bytes_saved"])
+    logging.info(
+        f"Trechos sem fala removidos: {report['seconds_removed']:.1f}s de {report['seconds_total']:.1f}s "
+        f"({removed_ms / duration_ms:.0%}), ~{report['bytes_saved'] / 1024 / 1024:.1f} MB a menos no envio"
+    )
+    return output_file, time_map, report
@@ -0,0 +1,56 @@
+import os
+import json
+import base64
+from .rate_limiter import CHARS_PER_TOKEN, estimate_audio_tokens
+
+# Bloco lido do disco por vez; múltiplo de 3 para que o base64 de cada bloco não tenha padding
+READ_BLOCK_SIZE = 3 * 64 * 1024
+
+class StreamingAudioPayload:
+    """
+    Corpo JSON de uma requisição generateContent com áudio inline, gerado em
+    blocos (arquivo -> base64 -> JSON) sem montar o áudio codificado em memória.
+    Pode ser iterado várias vezes, o que permite reenviá-lo em novas tentativas.
+    """
+
+    def __init__(self, prompt, audio_file, mime_type, block_size=READ_BLOCK_SIZE, generation_config=None):
+        self.prompt = prompt
+        self.audio_file = audio_file
+        self.mime_type = mime_type
+        self.block_size = block_size - block_size % 3
+        self._prefix = (
+            '{"contents": [{"parts": [{"text": %s}, '
+            '{"inlineData": {"mimeType": %s, "data": "' % (json.dumps(prompt), json.dumps(mime_type))
+        ).encode("utf-8")
+        self._suffix = b'"}}]}]'
+        if generation_config:
+            self._suffix += b', "generationConfig": ' + json.dumps(generation_config).encode("utf-8")
+        self._suffix += b'}'
+
+    def audio_size(self):
+        return os.path.getsize(self.audio_file)
+
+    def __len__(self):
+        # Tamanho exato do corpo, para enviar Content-Length em vez de chunked
+        encoded_size = 4 * ((self.audio_size() + 2) // 3)
+        return len(self._prefix) + encoded_size + len(self._suffix)
+
+    def __iter__(self):
+        yield self._prefix
+        with open(self.audio_file, "rb") as f:
+            while True:
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                yield base64.b64encode(block)
+        yield self._suffix
+
+    async def __aiter__(self):
+        for block in self:
+            yield block
+
+    def estimated_tokens(self):
+        """Estimativa de tokens de entrada, usada pelo limitador de taxa"""
+        with open(self.audio_file, "rb") as f:
+            header = f.read(44)
+        return len(self.prompt) // CHARS_PER_TOKEN + estimate_audio_tokens(header, self.audio_size())
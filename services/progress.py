@@ -0,0 +1,38 @@
+import logging
+
+# Tipos de evento entregues ao callback, sempre como dicionários com a chave "type"
+STAGE = "stage"        # {"stage", "message"}: início de uma etapa do pipeline
+CHUNK = "chunk"        # {"done", "total"}: chunks concluídos até agora
+PARTIAL = "partial"    # {"stage", "text"}: trecho novo do texto da etapa, na ordem em que será exibido
+RESULT = "result"      # {"result"}: tupla final (transcrição, melhorada, análise)
+
+STAGE_MESSAGES = {
+    "one_shot": "Transcrevendo e analisando em uma única requisição...",
+    "transcription": "Transcrevendo áudio...",
+    "improve": "Melhorando a transcrição...",
+    "analysis": "Gerando análise...",
+}
+
+class ProgressReporter:
+    """Repassa eventos de progresso ao callback do chamador; erros no callback não interrompem o job"""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+
+    def emit(self, event_type, **data):
+        if not self.callback:
+            return
+        try:
+            self.callback({"type": event_type, **data})
+        except Exception as e:
+            logging.error(f"Erro no callback de progresso: {e}")
+
+    def stage(self, stage):
+        self.emit(STAGE, stage=stage, message=STAGE_MESSAGES.get(stage, stage))
+
+    def chunk(self, done, total):
+        self.emit(CHUNK, done=done, total=total)
+
+    def partial(self, text, stage="transcription"):
+        if text:
+            self.emit(PARTIAL, stage=stage, text=text)
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import threading
+from config.config import GEMINI_CONFIG, STATE_DIR
+from utils.file_lock import FileLock
+from utils.metrics import metrics
+
+RATE_LIMIT_DIR = STATE_DIR / "rate_limits"
+
+# A API contabiliza ~32 tokens por segundo de áudio e ~4 caracteres por token de texto
+AUDIO_TOKENS_PER_SECOND = 32
+CHARS_PER_TOKEN = 4
+# Taxa assumida quando o formato do áudio não é reconhecido (equivale a MP3 de 128 kbps)
+DEFAULT_AUDIO_BYTES_PER_SECOND = 16000
+# Assinaturas dos formatos comprimidos exportados pelo divisor de áudio (ver upload_codec)
+COMPRESSED_SIGNATURES = {"opus": (b"OggS",), "mp3": (b"ID3", b"\xff\xfb", b"\xff\xf3")}
+
+def _flac_seconds(header):
+    """Duração de um FLAC pelo bloco STREAMINFO (taxa de amostragem e total de amostras)"""
+    streaminfo = int.from_bytes(header[18:26], "big")
+    sample_rate = streaminfo >> 44
+    total_samples = streaminfo & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+def estimate_audio_tokens(header, audio_bytes):
+    """
+    Estima os tokens de um áudio a partir do cabeçalho e do tamanho: byte
+    rate do WAV, duração do FLAC ou taxa nominal do codec de upload.
+    """
+    seconds = None
+    bytes_per_second = DEFAULT_AUDIO_BYTES_PER_SECOND
+    settings = GEMINI_CONFIG["upload_codec"]
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        bytes_per_second = int.from_bytes(header[28:32], "little") or bytes_per_second
+    elif header[:4] == b"fLaC":
+        seconds = _flac_seconds(header)
+    elif header.startswith(COMPRESSED_SIGNATURES.get(settings["codec"], ())) and settings.get("bitrate"):
+        bytes_per_second = settings["bitrate"] / 8
+    if seconds is None:
+        seconds = audio_bytes / bytes_per_second
+    return int(seconds * AUDIO_TOKENS_PER_SECOND)
+
+# Tokens estimados dos áudios enviados pela API de arquivos, por URI
+_file_tokens = {}
+
+def register_file_tokens(file_uri, tokens):
+    """Registra a estimativa de tokens de um áudio referenciado por URI"""
+    _file_tokens[file_uri] = tokens
+
+def estimate_tokens(payload):
+    """Estima os tokens de entrada de um payload generateContent"""
+    if not isinstance(payload, dict):
+        # Payloads em streaming sabem estimar a partir do arquivo de origem
+        return max(payload.estimated_tokens(), 1)
+    tokens = 0
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                tokens += len(part["text"]) // CHARS_PER_TOKEN
+            elif "inlineData" in part:
+                data = part["inlineData"]["data"]
+                header = base64.b64decode(data[:60])
+                tokens += estimate_audio_tokens(header, len(data) * 3 // 4)
+            elif "fileData" in part:
+                tokens += _file_tokens.get(part["fileData"]["fileUri"], 0)
+    return max(tokens, 1)
+
+def _refill(bucket, capacity, now):
+    """Repõe os tokens de um balde proporcionalmente ao tempo decorrido"""
+    elapsed = max(0.0, now - bucket["updated"])
+    bucket["tokens"] = min(capacity, bucket["tokens"] + elapsed * capacity / 60.0)
+    bucket["updated"] = now
+
+def _reserve(state, limits, tokens, now, only_if_available=False):
+    """
+    Reserva uma requisição e `tokens` tokens nos baldes e devolve quantos
+    segundos o chamador deve esperar. O saldo pode ficar negativo: a dívida
+    é paga pelas reposições seguintes, o que mantém a ordem de chegada.
+    Com only_if_available, nada é reservado (e retorna None) se houver espera.
+    """
+    buckets = []
+    for name, amount in (("requests", 1), ("tokens", tokens)):
+        capacity = limits["rpm" if name == "requests" else "tpm"]
+        bucket = state.setdefault(name, {"tokens": capacity, "updated": now})
+        _refill(bucket, capacity, now)
+        # Um pedido maior que o balde inteiro esperaria para sempre
+        buckets.append((bucket, min(amount, capacity), capacity))
+
+    if only_if_available and any(bucket["tokens"] < amount for bucket, amount, _ in buckets):
+        return None
+
+    wait = 0.0
+    for bucket, amount, capacity in buckets:
+        bucket["tokens"] -= amount
+        if bucket["tokens"] < 0:
+            wait = max(wait, -bucket["tokens"] * 60.0 / capacity)
+    return wait
+
+def _available(state, limits, now):
+    """Fração da cota ainda disponível (0 a 1) no balde mais apertado, sem reservar nada"""
+    fractions = []
+    for name in ("requests", "tokens"):
+        capacity = limits["rpm" if name == "requests" else "tpm"]
+        bucket = dict(state.get(name) or {"tokens": capacity, "updated": now})
+        _refill(bucket, capacity, now)
+        fractions.append(bucket["tokens"] / capacity)
+    return max(0.0, min(fractions))
+
+class MemoryBackend:
+    """Estado dos baldes em memória, compartilhado pelas threads do processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def reserve(self, limits, tokens, only_if_available=False):
+        with self._lock:
+            return _reserve(self._state, limits, tokens, time.time(), only_if_available)
+
+    def available(self, limits):
+        with self._lock:
+            return _available(self._state, limits, time.time())
+
+class FileLockBackend:
+    """Estado dos baldes em arquivo, compartilhado por todos os processos da máquina"""
+
+    def __init__(self, name):
+        self.state_file = RATE_LIMIT_DIR / f"{name}.json"
+        self.lock = FileLock(str(RATE_LIMIT_DIR / f"{name}.lock"))
+
+    def _load(self):
+        if self.state_file.exists():
+            try:
+                return json.loads(self.state_file.read_text())
+            except ValueError:
+                logging.warning(f"Estado de limite corrompido, recriando: {self.state_file}")
+        return {}
+
+    def available(self, limits):
+        with self.lock:
+            return _available(self._load(), limits, time.time())
+
+    def reserve(self, limits, tokens, only_if_available=False):
+        with self.lock:
+            state = self._load()
+            wait = _reserve(state, limits, tokens, time.time(), only_if_available)
+            tmp_file = self.state_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(state))
+            os.replace(tmp_file, self.state_file)
+            return wait
+
+class RateLimiter:
+    """Limitador token bucket de requisições/minuto e tokens de entrada/minuto"""
+
+    def __init__(self, name, limits, backend="memory"):
+        self.name = name
+        self.limits = limits
+        self.backend = FileLockBackend(name) if backend == "file" else MemoryBackend()
+
+    def _reserve(self, tokens):
+        wait = self.backend.reserve(self.limits, tokens)
+        metrics.incr("rate_limit.requests")
+        if wait > 0:
+            metrics.incr("rate_limit.throttled")
+            metrics.incr("rate_limit.wait_seconds", wait)
+            logging.info(f"Limite de taxa atingido, aguardando {wait:.1f}s")
+        return wait
+
+    def try_acquire(self, tokens=1):
+        """Reserva cota apenas se ela estiver disponível agora, sem esperar"""
+        reserved = self.backend.reserve(self.limits, tokens, only_if_available=True) is not None
+        if reserved:
+            metrics.incr("rate_limit.requests")
+        return reserved
+
+    def acquire(self, tokens=1):
+        """Reserva cota e bloqueia até que ela esteja disponível"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """Reserva cota e aguarda sem bloquear o loop de eventos"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def available(self):
+        """Fração da cota disponível agora (0 a 1), usada para escolher entre chaves"""
+        return self.backend.available(self.limits)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def _model_url(url):
+    # generateContent e streamGenerateContent do mesmo modelo dividem a cota
+    base, _, _ = url.rpartition(":")
+    return base if "/models/" in base else url
+
+def get_rate_limiter(url, key_id=None):
+    """Retorna o limitador compartilhado para a URL de modelo e a chave de API informadas"""
+    # A cota da API é por chave: cada chave do pool tem seus próprios baldes
+    model_url = _model_url(url)
+    limiter_key = (model_url, key_id)
+    with _limiters_lock:
+        if limiter_key not in _limiters:
+            rate_limits = GEMINI_CONFIG["rate_limits"]
+            limits = rate_limits.get(url) or rate_limits.get(model_url) or rate_limits["default"]
+            identity = model_url if key_id is None else f"{model_url}\0{key_id}"
+            name = hashlib.sha1(identity.encode()).hexdigest()[:16]
+            _limiters[limiter_key] = RateLimiter(name, limits, GEMINI_CONFIG["rate_limit_backend"])
+        return _limiters[limiter_key]
@@ -0,0 +1,71 @@
+import time
+import asyncio
+import logging
+from config.config import GEMINI_CONFIG
+from .gemini_client import extract_text
+from .concurrency import retry_delay
+from .circuit_breaker import CircuitOpenError
+
+def _response_text(response):
+    """Texto de uma resposta bem-sucedida, ou None"""
+    if response.status_code == 200:
+        return extract_text(response.json())
+    return None
+
+def _log_failure(label, retries, last_error):
+    logging.error(f"{label}: falha após {retries} tentativas. Último erro: {last_error}")
+
+def post_with_retries(send, label):
+    """
+    Chama send(), que faz a requisição e devolve a resposta, até obter uma
+    resposta 200 com texto. Entre as tentativas espera conforme retry_delay;
+    com o circuito aberto desiste na hora. Retorna o texto ou None.
+    """
+    retries = 0
+    last_error = None
+    while retries < GEMINI_CONFIG["max_retries"]:
+        response = None
+        try:
+            response = send()
+            text = _response_text(response)
+            if text:
+                return text
+            last_error = response.text
+        except CircuitOpenError as e:
+            # Com o circuito aberto não adianta insistir: falha imediatamente
+            last_error = str(e)
+            break
+        except Exception as e:
+            last_error = str(e)
+
+        retries += 1
+        if retries < GEMINI_CONFIG["max_retries"]:
+            time.sleep(retry_delay(response, retries))
+
+    _log_failure(label, retries, last_error)
+    return None
+
+async def post_with_retries_async(send, label):
+    """Versão assíncrona de post_with_retries: send() devolve uma corrotina"""
+    retries = 0
+    last_error = None
+    while retries < GEMINI_CONFIG["max_retries"]:
+        response = None
+        try:
+            response = await send()
+            text = _response_text(response)
+            if text:
+                return text
+            last_error = response.text
+        except CircuitOpenError as e:
+            last_error = str(e)
+            break
+        except Exception as e:
+            last_error = str(e)
+
+        retries += 1
+        if retries < GEMINI_CONFIG["max_retries"]:
+            await asyncio.sleep(retry_delay(response, retries))
+
+    _log_failure(label, retries, last_error)
+    return None
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import functools
+import threading
+from config.config import GEMINI_API_URL, GEMINI_CONFIG, STATE_DIR
+from utils.disk_cache import DiskCache
+
+STAGE_MEMO_DIR = STATE_DIR / "stage_memo"
+
+def stage_memo_key(stage, prompt_version, model_url, text):
+    """Chave da memória de etapas: (etapa, versão do prompt, modelo, SHA do texto de entrada)"""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = f"{stage}\0{prompt_version}\0{model_url}\0{text_hash}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+_memo = None
+_memo_lock = threading.Lock()
+
+def get_stage_memo():
+    """Retorna a memória de etapas de texto, ou None se estiver desativada"""
+    global _memo
+    settings = GEMINI_CONFIG["stage_memo"]
+    if not settings["enabled"]:
+        return None
+    with _memo_lock:
+        if _memo is None:
+            _memo = DiskCache(STAGE_MEMO_DIR, settings["max_mb"] * 1024 * 1024, "stage_memo")
+    return _memo
+
+def memoize_stage(stage, prompt_version):
+    """
+    Decorador para etapas de texto (texto -> texto). Só resultados válidos
+    são memorizados; mudar a versão do prompt de uma etapa refaz apenas ela.
+    prompt_version também pode ser uma função do texto de entrada, para
+    etapas cujo caminho (e portanto os prompts usados) depende do texto.
+    Em um acerto, o texto memorizado é repassado ao on_text da chamada.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(text, *args, **kwargs):
+            memo = get_stage_memo()
+            if not memo or not text:
+                return func(text, *args, **kwargs)
+
+            version = prompt_version(text) if callable(prompt_version) else prompt_version
+            key = stage_memo_key(stage, version, GEMINI_API_URL, text)
+            cached = memo.get(key)
+            if cached is not None:
+                logging.info(f"Etapa '{stage}' obtida da memória")
+                # Quem acompanha o texto em streaming recebe o resultado de uma vez
+                on_text = kwargs.get("on_text")
+                if on_text:
+                    on_text(cached)
+                return cached
+
+            result = func(text, *args, **kwargs)
+            if result:
+                memo.put(key, result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,57 @@
+import os
+import wave
+import hashlib
+import logging
+import threading
+from config.config import GEMINI_CONFIG, STATE_DIR
+from utils.disk_cache import DiskCache
+
+TRANSCRIPT_CACHE_DIR = STATE_DIR / "transcript_cache"
+
+def _hash_audio(audio_file, digest):
+    """
+    Alimenta o hash com o conteúdo do chunk. WAV entra pelo PCM, independente
+    do cabeçalho; os formatos comprimidos exportados pelo divisor (sem
+    metadados) entram pelos bytes do arquivo, sem decodificar o áudio.
+    """
+    try:
+        with wave.open(audio_file, "rb") as wf:
+            digest.update(repr(wf.getparams()[:3]).encode())
+            while True:
+                frames = wf.readframes(65536)
+                if not frames:
+                    break
+                digest.update(frames)
+        return
+    except (wave.Error, EOFError):
+        pass
+    digest.update(os.path.splitext(audio_file)[1].lower().encode())
+    with open(audio_file, "rb") as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            digest.update(block)
+
+def transcript_cache_key(audio_file, prompt, url):
+    """Chave do cache: hash do áudio do chunk, do prompt e da URL do modelo"""
+    digest = hashlib.sha256()
+    _hash_audio(audio_file, digest)
+    digest.update(b"\0" + prompt.encode("utf-8"))
+    digest.update(b"\0" + url.encode("utf-8"))
+    return digest.hexdigest()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_transcript_cache():
+    """Retorna o cache de transcrições, ou None se estiver desativado"""
+    global _cache
+    settings = GEMINI_CONFIG["transcript_cache"]
+    if not settings["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(TRANSCRIPT_CACHE_DIR, settings["max_mb"] * 1024 * 1024, "transcript_cache")
+            logging.info(f"Cache de transcrições em {TRANSCRIPT_CACHE_DIR}")
+    return _cache
@@ -1,275 +1,277 @@
 import os
-import requests
+import re
 import json
-import base64
 import logging
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from config.config import GEMINI_API_KEY, GEMINI_API_URL, GEMINI_CONFIG
-from .audio_processing import split_audio, combine_texts
-from utils.audio_processing import split_audio_file
+from concurrent.futures import ThreadPoolExecutor
+from config.config import GEMINI_API_KEY, GEMINI_CONFIG
+from .gemini_client import get_gemini_client, extract_text
+from .stage_memo import memoize_stage
 
-def process_transcription(audio_file):
-    """Processa a transcrição do áudio usando threads"""
-    try:
-        audio_chunks = split_audio(audio_file, max_size_mb=GEMINI_CONFIG["chunk_size_mb"])
-        if not audio_chunks:
-            logging.error("Falha ao dividir o áudio em chunks")
-            return None
-
-        # Usando ThreadPoolExecutor para processamento paralelo
-        with ThreadPoolExecutor(max_workers=GEMINI_CONFIG["max_workers"]) as executor:
-            # Submete todos os chunks para processamento
-            future_to_chunk = {
-                executor.submit(transcribe_chunk, chunk): i 
-                for i, chunk in enumerate(audio_chunks, 1)
-            }
-
-            transcriptions = [None] * len(audio_chunks)
-            for future in as_completed(future_to_chunk):
-                chunk_index = future_to_chunk[future]
-                try:
-                    result = future.result()
-                    if result:
-                        transcriptions[chunk_index - 1] = result
-                        logging.info(f"Chunk {chunk_index} processado com sucesso")
-                    else:
-                        logging.error(f"Falha ao processar chunk {chunk_index}")
-                except Exception as e:
-                    logging.error(f"Erro no chunk {chunk_index}: {e}")
-
-        # Filtra chunks que falharam
-        transcriptions = [t for t in transcriptions if t]
-        
-        if not transcriptions:
-            logging.error("Nenhum chunk foi transcrito com sucesso")
-            return None
-
-        return combine_texts(transcriptions)
-    except Exception as e:
-        logging.error(f"Erro no processamento da transcrição: {e}")
-        return None
+# Ao alterar um prompt, incremente sua versão: só a etapa correspondente será refeita
+IMPROVE_PROMPT_VERSION = 1
+IMPROVE_PROMPT = """Corrija a ortografia e gramática do texto a seguir, 
+                    mantendo o significado original e preservando os diálogos:
+                    {text}"""
 
-def transcribe_chunk(audio_file):
-    """Transcreve um chunk de áudio"""
-    retries = 0
-    last_error = None
-    
-    while retries < GEMINI_CONFIG["max_retries"]:
-        try:
-            with open(audio_file, "rb") as f:
-                audio_data = f.read()
-            
-            audio_encoded = base64.b64encode(audio_data).decode("utf-8")
-            
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": "Transcreva este áudio para texto em português brasileiro."
-                    }, {
-                        "inlineData": {
-                            "mimeType": "audio/mpeg",
-                            "data": audio_encoded
-                        }
-                    }]
-                }]
-            }
-
-            response = requests.post(
-                GEMINI_API_URL,
-                headers=GEMINI_CONFIG["headers"],
-                json=payload,
-                timeout=GEMINI_CONFIG["timeout"]
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if "candidates" in result and result["candidates"]:
-                    return result["candidates"][0]["content"]["parts"][0]["text"]
-            
-            last_error = response.text
-            
-        except Exception as e:
-            last_error = str(e)
-            
-        retries += 1
-        if retries < GEMINI_CONFIG["max_retries"]:
-            time.sleep(2 ** retries)
-
-    logging.error(f"Falha após {retries} tentativas. Último erro: {last_error}")
-    return None
+IMPROVE_WINDOW_PROMPT_VERSION = 1
+IMPROVE_WINDOW_PROMPT = """Corrija a ortografia e gramática do trecho a seguir, 
+                    mantendo o significado original e preservando os diálogos.
+                    O contexto anterior serve apenas de referência: não o corrija
+                    nem o repita na resposta.
+                    Contexto anterior: {context}
+                    Trecho: {text}"""
+
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_PROMPT = """
+                    Analise o seguinte texto e forneça:
+                    1. Um breve resumo (2-3 frases)
+                    2. Principais pontos (máximo 3)
+                    3. Tom da conversa/conteúdo
+                    4. Insights adicionais relevantes
+
+                    Texto para análise:
+                    {text}
+                    """
+
+# Textos longos: cada janela vira um resumo parcial e os parciais são combinados
+SUMMARY_MAP_PROMPT_VERSION = 1
+SUMMARY_MAP_PROMPT = """
+                    O texto a seguir é um trecho de uma transcrição mais longa.
+                    Resuma-o em poucos parágrafos, preservando os principais
+                    pontos, o tom da conversa/conteúdo e detalhes relevantes:
+                    {text}
+                    """
+
+SUMMARY_MERGE_PROMPT_VERSION = 1
+SUMMARY_MERGE_PROMPT = """
+                    Os textos a seguir são resumos de trechos consecutivos de uma
+                    mesma transcrição. Combine-os em um único resumo, preservando
+                    os principais pontos, o tom e detalhes relevantes:
+                    {text}
+                    """
+
+SUMMARY_REDUCE_PROMPT_VERSION = 1
+SUMMARY_REDUCE_PROMPT = """
+                    Os textos a seguir são resumos de trechos consecutivos de uma
+                    mesma transcrição. Com base neles, forneça:
+                    1. Um breve resumo (2-3 frases)
+                    2. Principais pontos (máximo 3)
+                    3. Tom da conversa/conteúdo
+                    4. Insights adicionais relevantes
+
+                    Resumos dos trechos:
+                    {text}
+                    """
+
+def process_transcription(audio_file):
+    """Processa a transcrição do áudio usando o motor assíncrono"""
+    # Importação local: o motor assíncrono importa as etapas de texto deste módulo
+    from .async_engine import run_transcription
+    return run_transcription(audio_file)
 
 def transcribe_audio_gemini(audio_file):
     """Transcreve um arquivo de áudio usando a API Gemini"""
-    try:
-        # Divide o áudio em chunks menores
-        chunks = split_audio_file(audio_file)
-        if not chunks:
-            return None
-
-        # Processa cada chunk
-        transcriptions = []
-        for i, chunk in enumerate(chunks, 1):
-            logging.info(f"Processando chunk {i} de {len(chunks)}")
-            
-            with open(chunk, "rb") as f:
-                audio_data = f.read()
-
-            audio_encoded = base64.b64encode(audio_data).decode("utf-8")
-            
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": "Transcreva este áudio para texto em português."
-                    }, {
-                        "inlineData": {
-                            "mimeType": "audio/wav",
-                            "data": audio_encoded
-                        }
-                    }]
-                }]
-            }
-
-            response = requests.post(
-                GEMINI_API_URL, 
-                json=payload,
-                headers=GEMINI_CONFIG["headers"],
-                timeout=GEMINI_CONFIG["timeout"]
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if "candidates" in result and result["candidates"]:
-                    transcriptions.append(result["candidates"][0]["content"]["parts"][0]["text"])
-            else:
-                logging.error(f"Erro no chunk {i}: {response.text}")
-        
-        # Combina as transcrições
-        if transcriptions:
-            return " ".join(transcriptions)
-        return None
+    from .async_engine import run_transcription
+    return run_transcription(audio_file)
 
-    except Exception as e:
-        logging.error(f"Erro na transcrição: {e}")
-        return None
+def split_text(text, window_chars):
+    """
+    Divide o texto em janelas de até window_chars caracteres, cortando no fim
+    de frase mais próximo do limite (ou em um espaço, se não houver frase).
+    """
+    windows = []
+    start = 0
+    while len(text) - start > window_chars:
+        end = start + window_chars
+        window = text[start:end]
+        sentence_ends = [m.end() for m in re.finditer(r"[.!?…]\s", window)]
+        if sentence_ends and sentence_ends[-1] > window_chars // 2:
+            end = start + sentence_ends[-1]
+        elif " " in window[window_chars // 2:]:
+            end = start + window.rindex(" ") + 1
+        windows.append(text[start:end].strip())
+        start = end
+    windows.append(text[start:].strip())
+    return [window for window in windows if window]
 
-def improve_transcript(transcricao_original):
-    """Melhora a transcrição usando Gemini"""
+def _generate_text(prompt, on_text=None):
+    """Envia um prompt de texto e retorna a resposta, ou None em caso de erro"""
     try:
         payload = {
             "contents": [{
                 "parts": [{
-                    "text": f"""Corrija a ortografia e gramática do texto a seguir, 
-                    mantendo o significado original e preservando os diálogos:
-                    {transcricao_original}"""
+                    "text": prompt
                 }]
             }]
         }
+        response = get_gemini_client().post(payload, on_text=on_text)
+        if response.status_code == 200:
+            text = extract_text(response.json())
+            if text:
+                return text
+        logging.error(f"Erro na API Gemini: {response.text}")
+    except Exception as e:
+        logging.error(f"Erro na requisição à API Gemini: {e}")
+    return None
+
+@memoize_stage("improve_window", IMPROVE_WINDOW_PROMPT_VERSION)
+def _improve_window(prompt, on_text=None):
+    # A chave da memória é o prompt inteiro, que inclui o contexto da janela
+    return _generate_text(prompt, on_text)
 
-        response = requests.post(
-            GEMINI_API_URL,
-            json=payload,
-            headers=GEMINI_CONFIG["headers"],
-            timeout=GEMINI_CONFIG["timeout"]
+def _improve_windowed(text, on_text=None):
+    """
+    Melhora o texto em janelas enviadas em paralelo. Cada janela leva o fim
+    da janela anterior (ainda sem correção) como contexto somente leitura;
+    as janelas corrigidas são remontadas em ordem e as que falharem ficam
+    com o texto original. Só a primeira janela é repassada a on_text em
+    streaming; as demais são repassadas inteiras, em ordem, ao terminar.
+    """
+    settings = GEMINI_CONFIG["improve_windows"]
+    windows = split_text(text, settings["window_chars"])
+    prompts = [
+        IMPROVE_WINDOW_PROMPT.format(
+            context=windows[index - 1][-settings["context_chars"]:] if index else "",
+            text=window
         )
+        for index, window in enumerate(windows)
+    ]
+    logging.info(f"Melhorando a transcrição em {len(windows)} janelas")
 
-        if response.status_code == 200:
-            result = response.json()
-            return result["candidates"][0]["content"]["parts"][0]["text"]
+    with ThreadPoolExecutor(max_workers=GEMINI_CONFIG["max_concurrency"]) as executor:
+        futures = [
+            executor.submit(_improve_window, prompt, on_text=on_text if index == 0 else None)
+            for index, prompt in enumerate(prompts)
+        ]
+        improved = []
+        for index, future in enumerate(futures):
+            improved.append(future.result())
+            if on_text and index:
+                on_text(" " + (improved[-1] or windows[index]).strip())
 
-        logging.error(f"Erro na API Gemini: {response.text}")
+    failed = improved.count(None)
+    if failed == len(windows):
         return None
+    if failed:
+        logging.warning(f"{failed} de {len(windows)} janelas mantidas sem correção")
+    return " ".join(result.strip() if result else window for result, window in zip(improved, windows))
 
-    except Exception as e:
-        logging.error(f"Erro na melhoria da transcrição: {e}")
-        return None
+def _improve_version(text):
+    """Versão da etapa de melhoria para a memória: o caminho em janelas depende dos seus prompts e parâmetros"""
+    settings = GEMINI_CONFIG["improve_windows"]
+    if len(text) > settings["window_chars"]:
+        return ("windowed", IMPROVE_WINDOW_PROMPT_VERSION, settings["window_chars"], settings["context_chars"])
+    return IMPROVE_PROMPT_VERSION
+
+@memoize_stage("improve", _improve_version)
+def improve_transcript(transcricao_original, on_text=None):
+    """Melhora a transcrição usando Gemini; on_text recebe o texto à medida que chega"""
+    # Textos curtos continuam em uma única requisição, como antes
+    if len(transcricao_original) > GEMINI_CONFIG["improve_windows"]["window_chars"]:
+        return _improve_windowed(transcricao_original, on_text)
 
-def generate_summary_and_insights(transcricao_melhorada):
-    """Gera um resumo e percepções do texto transcrito"""
     try:
         payload = {
             "contents": [{
                 "parts": [{
-                    "text": f"""
-                    Analise o seguinte texto e forneça:
-                    1. Um resumo conciso em 2-3 frases
-                    2. Pontos principais (máximo 3)
-                    3. Tom geral da conversa (formal/informal, emotivo/neutro, etc.)
-                    4. Percepções adicionais relevantes
-
-                    Texto para análise:
-                    {transcricao_melhorada}
-                    """
+                    "text": IMPROVE_PROMPT.format(text=transcricao_original)
                 }]
             }]
         }
 
-        response = requests.post(
-            GEMINI_API_URL,
-            json=payload,
-            headers=GEMINI_CONFIG["headers"],
-            timeout=GEMINI_CONFIG["timeout"]
-        )
+        response = get_gemini_client().post(payload, on_text=on_text)
 
         if response.status_code == 200:
             result = response.json()
             return result["candidates"][0]["content"]["parts"][0]["text"]
 
-        logging.error(f"Erro na API Gemini durante análise: {response.text}")
+        logging.error(f"Erro na API Gemini: {response.text}")
         return None
 
     except Exception as e:
-        logging.error(f"Erro ao gerar resumo e percepções: {e}")
+        logging.error(f"Erro na melhoria da transcrição: {e}")
         return None
 
 def process_and_analyze_transcription(audio_file):
     """Processa a transcrição completa incluindo análise"""
-    try:
-        # Transcrição inicial
-        transcricao = transcribe_audio_gemini(audio_file)
-        if not transcricao:
-            return None, None, None
-        
-        # Melhoria da transcrição
-        transcricao_melhorada = improve_transcript(transcricao)
-        if not transcricao_melhorada:
-            transcricao_melhorada = transcricao
-        
-        # Geração de análise
-        analise = generate_summary_and_insights(transcricao_melhorada)
-        
-        return transcricao, transcricao_melhorada, analise
-        
-    except Exception as e:
-        logging.error(f"Erro no processamento completo: {e}")
-        return None, None, None
+    from .async_engine import run_pipeline
+    return run_pipeline(audio_file)
+
+@memoize_stage("summary_map", SUMMARY_MAP_PROMPT_VERSION)
+def _summarize_window(text):
+    return _generate_text(SUMMARY_MAP_PROMPT.format(text=text))
+
+@memoize_stage("summary_merge", SUMMARY_MERGE_PROMPT_VERSION)
+def _merge_summaries(text):
+    return _generate_text(SUMMARY_MERGE_PROMPT.format(text=text))
+
+def _group_summaries(summaries, window_chars):
+    """Agrupa resumos consecutivos em blocos de até window_chars, com pelo menos dois por bloco"""
+    groups = [[]]
+    size = 0
+    for summary in summaries:
+        if len(groups[-1]) >= 2 and size + len(summary) > window_chars:
+            groups.append([])
+            size = 0
+        groups[-1].append(summary)
+        size += len(summary)
+    return ["\n\n".join(group) for group in groups]
+
+def _map_reduce_summary(text, on_text=None):
+    """
+    Resumo hierárquico: as janelas do texto são resumidas em paralelo e os
+    resumos parciais são combinados em níveis até caberem em uma janela,
+    quando viram a análise final no mesmo formato de SUMMARY_PROMPT.
+    """
+    window_chars = GEMINI_CONFIG["summary_map_reduce"]["window_chars"]
+    windows = split_text(text, window_chars)
+    logging.info(f"Resumo em map-reduce: {len(windows)} janelas de até {window_chars} caracteres")
+
+    with ThreadPoolExecutor(max_workers=GEMINI_CONFIG["max_concurrency"]) as executor:
+        summaries = list(executor.map(_summarize_window, windows))
+        failed = summaries.count(None)
+        if failed:
+            logging.warning(f"{failed} de {len(windows)} janelas não foram resumidas")
+        summaries = [summary for summary in summaries if summary]
+
+        level = 1
+        while len(summaries) > 1 and len("\n\n".join(summaries)) > window_chars:
+            level += 1
+            groups = _group_summaries(summaries, window_chars)
+            logging.info(f"Resumo em map-reduce: nível {level} com {len(groups)} grupos")
+            merged = list(executor.map(_merge_summaries, groups))
+            # Um grupo que falhou segue adiante com os resumos que já tinha
+            summaries = [result or group for result, group in zip(merged, groups)]
+
+    if not summaries:
+        return None
+    return _generate_text(SUMMARY_REDUCE_PROMPT.format(text="\n\n".join(summaries)), on_text)
+
+def _summary_version(text):
+    """Versão da etapa de análise para a memória: o map-reduce depende dos seus três prompts e da janela"""
+    settings = GEMINI_CONFIG["summary_map_reduce"]
+    if len(text) > settings["threshold_chars"]:
+        return ("map_reduce", SUMMARY_MAP_PROMPT_VERSION, SUMMARY_MERGE_PROMPT_VERSION,
+                SUMMARY_REDUCE_PROMPT_VERSION, settings["window_chars"])
+    return SUMMARY_PROMPT_VERSION
+
+@memoize_stage("summary", _summary_version)
+def generate_summary_and_insights(text, on_text=None):
+    """Gera um resumo e percepções do texto; on_text recebe o texto à medida que chega"""
+    # Textos longos demais para uma única requisição são resumidos por partes
+    if len(text) > GEMINI_CONFIG["summary_map_reduce"]["threshold_chars"]:
+        return _map_reduce_summary(text, on_text)
 
-def generate_summary_and_insights(text):
-    """Gera um resumo e percepções do texto"""
     try:
         payload = {
             "contents": [{
                 "parts": [{
-                    "text": f"""
-                    Analise o seguinte texto e forneça:
-                    1. Um breve resumo (2-3 frases)
-                    2. Principais pontos (máximo 3)
-                    3. Tom da conversa/conteúdo
-                    4. Insights adicionais relevantes
-
-                    Texto para análise:
-                    {text}
-                    """
+                    "text": SUMMARY_PROMPT.format(text=text)
                 }]
             }]
         }
 
-        response = requests.post(
-            GEMINI_API_URL,
-            json=payload,
-            headers=GEMINI_CONFIG["headers"],
-            timeout=GEMINI_CONFIG["timeout"]
-        )
+        response = get_gemini_client().post(payload, on_text=on_text)
 
         if response.status_code == 200:
             result = response.json()
@@ -12,11 +12,9 @@ from services.audio_service import (
     download_tiktok_video,
     download_instagram_story
 )
-from services.transcription_service import (
-    process_transcription, 
-    improve_transcript,
-    process_and_analyze_transcription  # Adicionada nova importação
-)
+from services.async_engine import iter_pipeline
+from services.progress import STAGE, CHUNK, PARTIAL, RESULT
+from services.job_journal import list_incomplete_jobs
 from utils.validators import (
     validate_audio_file,
     validate_video_file,
@@ -40,8 +38,9 @@ def main():
         logging.info("1. Gravação de voz")
         logging.info("2. Envio de arquivo (áudio ou vídeo)")
         logging.info("3. Envio de link")
+        logging.info("4. Retomar transcrição interrompida")
 
-        opcao = input("\nDigite 1, 2 ou 3: ").strip()
+        opcao = input("\nDigite 1, 2, 3 ou 4: ").strip()
 
         if opcao == "1":
             audio_file = record_audio()
@@ -67,32 +66,77 @@ def main():
                     logging.error(f"Erro ao processar URL: {e}")
             else:
                 logging.error("URL não suportada.")
+
+        elif opcao == "4":
+            resume_interrupted_job()
         
         else:
             logging.error("Opção inválida.")
 
         continue_processing = input("\nDeseja realizar novo envio (s/n)? ").lower().strip() == 's'
 
+def resume_interrupted_job(job_id=None):
+    """Lista os jobs interrompidos e retoma o escolhido (ou o informado)."""
+    if not job_id:
+        jobs = list_incomplete_jobs()
+        if not jobs:
+            logging.info("Nenhuma transcrição interrompida.")
+            return
+        for i, job in enumerate(jobs, 1):
+            logging.info(f"{i}. {job.summary()} [{job.job_id}]")
+        escolha = input("Digite o número do job: ").strip()
+        if not escolha.isdigit() or not 1 <= int(escolha) <= len(jobs):
+            logging.error("Opção inválida.")
+            return
+        job_id = jobs[int(escolha) - 1].job_id
+    show_results(*run_with_progress(job_id=job_id))
+
 def process_and_show_results(audio_file):
     """Processa o arquivo de áudio e mostra os resultados."""
     try:
-        transcricao, transcricao_melhorada, analise = process_and_analyze_transcription(audio_file)
-        
-        if transcricao:
-            print("\nTranscrição original:")
-            print(transcricao)
-            
-        if transcricao_melhorada:
-            print("\nTranscrição melhorada:")
-            print(transcricao_melhorada)
-            
-        if analise:
-            print("\nAnálise e Percepções:")
-            print(analise)
-        
+        show_results(*run_with_progress(audio_file))
     except Exception as e:
         logging.error(f"Erro ao processar arquivo: {e}")
 
+PARTIAL_HEADERS = {
+    "transcription": "Transcrição parcial",
+    "improve": "Transcrição melhorada (parcial)",
+    "analysis": "Análise (parcial)",
+}
+
+def run_with_progress(audio_file=None, job_id=None):
+    """Executa o pipeline imprimindo os textos parciais à medida que chegam."""
+    current_stage = None
+    for event in iter_pipeline(audio_file, job_id):
+        if event["type"] == STAGE:
+            logging.info(event["message"])
+        elif event["type"] == CHUNK:
+            logging.info(f"Chunks transcritos: {event['done']}/{event['total']}")
+        elif event["type"] == PARTIAL:
+            # Melhoria e análise podem chegar intercaladas; o cabeçalho indica a etapa
+            if event["stage"] != current_stage:
+                current_stage = event["stage"]
+                print(f"\n\n{PARTIAL_HEADERS[current_stage]}:")
+            print(event["text"], end="", flush=True)
+        elif event["type"] == RESULT:
+            if current_stage:
+                print()
+            return event["result"]
+
+def show_results(transcricao, transcricao_melhorada, analise):
+    """Mostra as transcrições e a análise."""
+    if transcricao:
+        print("\nTranscrição original:")
+        print(transcricao)
+        
+    if transcricao_melhorada:
+        print("\nTranscrição melhorada:")
+        print(transcricao_melhorada)
+        
+    if analise:
+        print("\nAnálise e Percepções:")
+        print(analise)
+
 def download_and_process_url(url, platform):
     """Baixa e processa áudio/vídeo de uma URL."""
     try:
@@ -133,4 +177,8 @@ def download_and_process_url(url, platform):
         return None
 
 if __name__ == '__main__':
-    main()
+    # python src/main.py --resume [job_id] retoma uma transcrição interrompida
+    if len(sys.argv) > 1 and sys.argv[1] == "--resume":
+        resume_interrupted_job(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        main()
@@ -0,0 +1,90 @@
+import time
+import wave
+import threading
+import pytest
+from services.clip_batcher import ClipBatcher, demux_response
+
+def test_demux_response_splits_by_label():
+    text = "[CLIPE 2]\nsegundo áudio\n[CLIPE 1]\nprimeiro áudio\n\n[CLIPE 3]\n"
+    assert demux_response(text, 3) == ["primeiro áudio", "segundo áudio", None]
+
+def test_demux_response_ignores_unknown_labels_and_missing_text():
+    assert demux_response("[CLIPE 5]\nfora do lote\n[CLIPE 1]\nok", 2) == ["ok", None]
+    assert demux_response("sem rótulos", 2) == [None, None]
+    assert demux_response(None, 1) == [None]
+
+class _FakeClip:
+    def __init__(self, size, duration):
+        self.size = size
+        self.duration = duration
+
+@pytest.fixture
+def batcher():
+    batcher = ClipBatcher()
+    batcher.max_clips = 3
+    batcher.max_batch_bytes = 100000
+    batcher.max_batch_seconds = 60
+    return batcher
+
+@pytest.mark.parametrize("clips, expected", [
+    ([(1000, 1)] * 5, 3),                          # limite de clipes
+    ([(40000, 1), (40000, 1), (40000, 1)], 2),     # limite de bytes
+    ([(1000, 30), (1000, 20), (1000, 20)], 2),     # limite de duração
+    ([(500000, 1), (1000, 1)], 1),                 # o primeiro sempre sai, mesmo acima do limite
+])
+def test_batch_size_respects_limits(batcher, clips, expected):
+    batcher._queue = [_FakeClip(size, duration) for size, duration in clips]
+    assert batcher._batch_size() == expected
+
+def _clip_file(tmp_path, name):
+    path = tmp_path / name
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(b"\0\0" * 16000)
+    return str(path)
+
+def _capture_batches(batcher):
+    batches = []
+    sent = threading.Event()
+
+    def send(batch):
+        batches.append([clip.audio_file for clip in batch])
+        for clip in batch:
+            clip.future.set_result("texto")
+        sent.set()
+
+    batcher._send = send
+    return batches, sent
+
+def test_lone_job_is_sent_without_waiting(batcher, tmp_path):
+    batcher.window_seconds = 5
+    batches, sent = _capture_batches(batcher)
+    batcher.job_started()
+    start = time.monotonic()
+    batcher.submit(_clip_file(tmp_path, "a.wav"), "audio/wav").result(timeout=2)
+    assert time.monotonic() - start < 1
+    assert len(batches) == 1
+
+def test_clips_of_concurrent_jobs_share_a_batch(batcher, tmp_path):
+    batcher.window_seconds = 5
+    batches, sent = _capture_batches(batcher)
+    batcher.job_started()
+    batcher.job_started()
+    first = batcher.submit(_clip_file(tmp_path, "a.wav"), "audio/wav")
+    time.sleep(0.1)
+    assert not sent.is_set()
+    second = batcher.submit(_clip_file(tmp_path, "b.wav"), "audio/wav")
+    assert first.result(timeout=2) == second.result(timeout=2) == "texto"
+    assert [len(batch) for batch in batches] == [2]
+
+def test_waiting_batch_is_sent_when_the_other_job_finishes(batcher, tmp_path):
+    batcher.window_seconds = 5
+    batches, sent = _capture_batches(batcher)
+    batcher.job_started()
+    batcher.job_started()
+    future = batcher.submit(_clip_file(tmp_path, "a.wav"), "audio/wav")
+    time.sleep(0.1)
+    batcher.job_finished()
+    assert future.result(timeout=1) == "texto"
@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from services.concurrency import AdaptiveConcurrencyController
+
+def test_cancelled_waiter_does_not_break_release():
+    controller = AdaptiveConcurrencyController(initial=1, minimum=1, maximum=1)
+    controller.acquire()
+
+    async def cancel_waiter():
+        task = asyncio.create_task(controller.acquire_async())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    # O loop do waiter cancelado é fechado ao fim do asyncio.run
+    asyncio.run(cancel_waiter())
+    assert not controller._async_waiters
+
+    for _ in range(3):
+        controller.release(200, 0.1)
+        controller.acquire()
+    controller.release(200, 0.1)
+    assert controller.in_flight == 0
+
+def test_release_skips_waiters_of_closed_loops():
+    controller = AdaptiveConcurrencyController(initial=1, minimum=1, maximum=1)
+    loop = asyncio.new_event_loop()
+    controller._async_waiters.append((loop, asyncio.Event()))
+    loop.close()
+    controller.acquire()
+    controller.release(200, 0.1)
+    assert not controller._async_waiters
+
+def _saturated_success(controller, latency, kind=None):
+    # Ocupa todas as vagas para que o sucesso conte como uso completo do limite
+    while controller.in_flight < int(controller.limit):
+        controller.acquire()
+    controller.release(200, latency, kind=kind)
+    while controller.in_flight:
+        controller.release(cancelled=True)
+
+def test_limit_grows_after_a_fast_outlier():
+    controller = AdaptiveConcurrencyController(initial=2, minimum=1, maximum=16)
+    _saturated_success(controller, 1.0)
+    for _ in range(300):
+        _saturated_success(controller, 10.0)
+    assert int(controller.limit) == 16
+
+def test_latency_baselines_are_kept_per_request_kind():
+    controller = AdaptiveConcurrencyController(initial=2, minimum=1, maximum=16)
+    for _ in range(20):
+        _saturated_success(controller, 0.5, kind="text")
+    limit = controller.limit
+    _saturated_success(controller, 10.0, kind="audio")
+    assert controller.limit > limit
+    assert controller.base_latency("text") == 0.5
+    assert controller.base_latency("audio") == 10.0
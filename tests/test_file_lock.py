@@ -0,0 +1,47 @@
+import threading
+import services.rate_limiter as rate_limiter
+from utils.file_lock import FileLock
+
+def test_shared_lock_serializes_threads(tmp_path):
+    lock = FileLock(str(tmp_path / "test.lock"))
+    inside = []
+    overlaps = []
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(200):
+                with lock:
+                    inside.append(1)
+                    if len(inside) > 1:
+                        overlaps.append(len(inside))
+                    inside.pop()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert not overlaps
+
+def test_file_backend_under_concurrent_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_DIR", tmp_path)
+    limiter = rate_limiter.RateLimiter("teste", {"rpm": 100000, "tpm": 10000000}, backend="file")
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(100):
+                limiter.backend.reserve(limiter.limits, 1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from services import gemini_client, circuit_breaker
+from services.circuit_breaker import CircuitBreaker, HALF_OPEN
+from services.gemini_client import AsyncGeminiClient, GeminiClient
+
+class _BlockedLimiter:
+    """Limitador que nunca libera, para interromper a requisição antes do envio"""
+
+    def acquire(self, tokens):
+        raise KeyboardInterrupt
+
+    async def acquire_async(self, tokens):
+        await asyncio.Event().wait()
+
+@pytest.fixture
+def half_open_breaker(monkeypatch):
+    breaker = CircuitBreaker()
+    breaker.enabled = True
+    breaker.state = HALF_OPEN
+    breaker.half_open_probes = 1
+    monkeypatch.setattr(circuit_breaker, "_breaker", breaker)
+    monkeypatch.setattr(gemini_client, "get_rate_limiter", lambda url, key_id=None: _BlockedLimiter())
+    return breaker
+
+def test_cancelled_probe_releases_slot(half_open_breaker):
+    async def run():
+        async with AsyncGeminiClient() as client:
+            task = asyncio.create_task(client.post({}, url="http://127.0.0.1:9/"))
+            await asyncio.sleep(0.05)
+            assert half_open_breaker.probes_in_flight == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(run())
+    assert half_open_breaker.probes_in_flight == 0
+    assert half_open_breaker.state == HALF_OPEN
+
+def test_interrupted_sync_probe_releases_slot(half_open_breaker):
+    with pytest.raises(KeyboardInterrupt):
+        GeminiClient().post({}, url="http://127.0.0.1:9/")
+    assert half_open_breaker.probes_in_flight == 0
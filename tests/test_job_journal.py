@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+import services.job_journal as job_journal
+from services.job_journal import JobJournal, CHUNK_DONE, JOB_DONE, JOB_FAILED
+from services.async_engine import AsyncTranscriptionEngine
+
+@pytest.fixture
+def audio_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_journal, "JOBS_DIR", tmp_path / "jobs")
+    path = tmp_path / "entrada.wav"
+    path.write_bytes(b"audio")
+    return path
+
+def _planned_journal(audio_file, count=3):
+    journal = JobJournal.open_or_create(str(audio_file))
+    journal.chunk_dir.mkdir(parents=True)
+    chunks = []
+    for index in range(count):
+        path = journal.chunk_dir / f"chunk_{index}.wav"
+        path.write_bytes(b"chunk %d" % index)
+        chunks.append({"index": index, "path": str(path), "start_ms": index * 1000, "duration_ms": 1000})
+    journal.set_plan(chunks)
+    return journal
+
+def test_failed_chunk_is_retried_alone(audio_file):
+    journal = _planned_journal(audio_file)
+    journal.mark_chunk(0, "primeiro trecho")
+    journal.mark_chunk(1, None)
+    journal.mark_chunk(2, "terceiro trecho")
+    journal.finish()
+    assert journal.manifest["status"] == JOB_FAILED
+
+    resumed = JobJournal.open_or_create(str(audio_file))
+    assert resumed.job_id == journal.job_id
+    assert resumed.has_plan()
+
+    engine = AsyncTranscriptionEngine()
+    calls = []
+
+    async def transcribe_chunk(path, index, source_seconds=None):
+        calls.append(index)
+        return "segundo trecho"
+
+    async def split(source, output_dir):
+        raise AssertionError("o plano do manifesto deveria ser reaproveitado")
+
+    engine.transcribe_chunk = transcribe_chunk
+    engine.split = split
+    text = asyncio.run(engine.transcribe(str(audio_file), resumed))
+
+    assert calls == [2]
+    assert text.split() == ["primeiro", "trecho", "segundo", "trecho", "terceiro", "trecho"]
+    assert resumed.manifest["status"] == JOB_DONE
+    assert not resumed.directory.exists()
+
+def test_done_job_is_not_reused(audio_file):
+    journal = _planned_journal(audio_file, count=1)
+    journal.mark_chunk(0, "texto")
+    journal.finish()
+    assert journal.texts() == ["texto"]
+    assert not journal.directory.exists()
+
+    assert JobJournal.open_or_create(str(audio_file)).chunks == []
+
+def test_legacy_done_manifest_is_discarded(audio_file):
+    journal = _planned_journal(audio_file, count=1)
+    journal.mark_chunk(0, "texto")
+    journal.manifest["status"] = JOB_DONE
+    journal.save()
+
+    fresh = JobJournal.open_or_create(str(audio_file))
+    assert fresh.chunks == []
+    assert not fresh.chunk_dir.exists()
+
+def test_has_plan_requires_the_files_of_unfinished_chunks(audio_file):
+    journal = _planned_journal(audio_file, count=2)
+    journal.mark_chunk(0, "texto")
+    assert journal.has_plan()
+
+    # Chunk concluído pode ter perdido o arquivo; um pendente não
+    (journal.chunk_dir / "chunk_0.wav").unlink()
+    assert journal.has_plan()
+    (journal.chunk_dir / "chunk_1.wav").unlink()
+    assert not journal.has_plan()
+    assert journal.chunks[0]["status"] == CHUNK_DONE
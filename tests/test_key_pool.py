@@ -0,0 +1,78 @@
+import pytest
+import services.key_pool as key_pool
+import services.rate_limiter as rate_limiter
+from config.config import GEMINI_CONFIG
+from services.key_pool import KeyPool, register_file_owner
+from services.rate_limiter import get_rate_limiter
+
+URL = "http://127.0.0.1/v1beta/models/mock:generateContent"
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(key_pool, "_file_owners", {})
+    monkeypatch.setitem(GEMINI_CONFIG, "rate_limit_backend", "memory")
+
+@pytest.fixture
+def pool():
+    return KeyPool(["chave-a", "chave-b"])
+
+def _file_payload(file_uri):
+    return {"contents": [{"parts": [{"text": "Transcreva"}, {"fileData": {"fileUri": file_uri}}]}]}
+
+def test_choose_rotates_to_the_key_with_more_quota(pool):
+    a, b = pool.credentials
+    get_rate_limiter(URL, a.key_id).acquire()
+    assert pool.choose(URL) == (b, 0)
+    get_rate_limiter(URL, b.key_id).acquire()
+    get_rate_limiter(URL, b.key_id).acquire()
+    assert pool.choose(URL) == (a, 0)
+
+def test_empty_and_single_key_pools():
+    assert KeyPool([]).choose(URL) == (None, 0)
+    single = KeyPool(["chave-a"])
+    assert single.choose(URL) == (single.credentials[0], 0)
+
+def test_429_benches_the_key_for_retry_after(pool):
+    a, b = pool.credentials
+    get_rate_limiter(URL, b.key_id).acquire()
+    pool.report(a, 429, {"Retry-After": "30"})
+    # b tem menos cota, mas a está em pausa
+    assert pool.choose(URL) == (b, 0)
+
+def test_all_keys_benched_waits_for_the_first_to_return(pool, monkeypatch):
+    monkeypatch.setitem(GEMINI_CONFIG["key_pool"], "bench_seconds", 60)
+    a, b = pool.credentials
+    pool.report(a, 429, {"Retry-After": "30"})
+    pool.report(b, 429)  # sem Retry-After: bench_seconds
+    credential, wait = pool.choose(URL)
+    assert credential == a
+    assert 29 < wait <= 30
+
+def test_other_results_do_not_bench(pool):
+    a, b = pool.credentials
+    pool.report(a, 503, {"Retry-After": "30"})
+    pool.report(None, 429)
+    assert pool.choose(URL)[1] == 0
+    assert not pool._benched_until
+
+def test_isolates_only_429_with_more_than_one_key(pool):
+    assert pool.isolates(429)
+    assert not pool.isolates(503)
+    assert not KeyPool(["chave-a"]).isolates(429)
+
+def test_file_uri_pins_the_owner_key(pool):
+    a, b = pool.credentials
+    uri = "http://127.0.0.1/v1beta/files/1"
+    register_file_owner(uri, b.key_id)
+    get_rate_limiter(URL, b.key_id).acquire()
+    assert pool.choose(URL, _file_payload(uri)) == (b, 0)
+
+    # Com a dona em pausa, espera por ela: o arquivo não vale para outra chave
+    pool.report(b, 429, {"Retry-After": "30"})
+    credential, wait = pool.choose(URL, _file_payload(uri))
+    assert credential == b and wait > 0
+
+def test_unknown_file_uri_and_streaming_payloads_are_not_pinned(pool):
+    assert key_pool._pinned_key_id(_file_payload("http://127.0.0.1/v1beta/files/desconhecido")) is None
+    assert key_pool._pinned_key_id(b"payload em streaming") is None
@@ -0,0 +1,157 @@
+import time
+import asyncio
+import pytest
+import requests
+import services.media_upload as media_upload
+import services.gemini_client as gemini_client
+import services.circuit_breaker as circuit_breaker
+import services.hedging as hedging
+from config.config import GEMINI_CONFIG
+from services.concurrency import AdaptiveConcurrencyController, retry_delay
+from services.gemini_client import GeminiClient, AsyncGeminiClient, iter_sse_events, extract_text
+from services.media_upload import MediaUploader
+from utils.mock_gemini_server import start_mock_server
+
+def _text_payload(text):
+    return {"contents": [{"parts": [{"text": text}]}]}
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # Estado compartilhado do processo isolado por teste: uploads, controle e circuito
+    monkeypatch.setattr(media_upload, "UPLOADS_FILE", tmp_path / "uploads.json")
+    monkeypatch.setattr(media_upload, "UPLOADS_LOCK", tmp_path / "uploads.lock")
+    controller = AdaptiveConcurrencyController()
+    monkeypatch.setattr(gemini_client, "get_concurrency_controller", lambda: controller)
+    monkeypatch.setattr(hedging, "get_concurrency_controller", lambda: controller)
+    monkeypatch.setattr(circuit_breaker, "_breaker", None)
+    srv = start_mock_server()
+    yield srv
+    srv.stop()
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "chunk.wav"
+    path.write_bytes(bytes(range(256)) * 400)
+    return path
+
+def test_upload_once_is_reused(server, audio_file):
+    uploader = MediaUploader(upload_url=server.upload_url)
+    uri = uploader.upload(str(audio_file), "audio/wav")
+    assert uploader.upload(str(audio_file), "audio/wav") == uri
+    assert server.stats["uploads"] == 1
+    assert server.stats["upload_bytes"] == audio_file.stat().st_size
+
+    payload = {"contents": [{"parts": [
+        {"text": "Transcreva"},
+        {"fileData": {"mimeType": "audio/wav", "fileUri": uri}},
+    ]}]}
+    response = GeminiClient().post(payload, url=server.api_url)
+    assert response.status_code == 200
+    assert f"arquivo:files/1:{audio_file.stat().st_size}" in extract_text(response.json())
+
+def test_interrupted_upload_resumes_from_confirmed_offset(server, audio_file):
+    uploader = MediaUploader(upload_url=server.upload_url)
+    size = audio_file.stat().st_size
+    session_url = uploader._start_session(str(audio_file), "audio/wav", size)
+
+    # Metade do arquivo chega antes da "queda"; o envio seguinte começa do zero,
+    # é recusado e a consulta (query) faz retomar do último byte confirmado
+    half = audio_file.read_bytes()[:size // 2]
+    requests.post(session_url, data=half, headers={
+        "X-Goog-Upload-Command": "upload", "X-Goog-Upload-Offset": "0",
+    }).raise_for_status()
+    assert uploader._query_offset(session_url)[0] == len(half)
+
+    file_info = uploader._send(session_url, str(audio_file), size)
+    assert file_info["sizeBytes"] == str(size)
+    assert server.stats["upload_bytes"] == size
+    assert server.stats["uploads"] == 1
+
+def test_iter_sse_events_parses_multiline_and_unterminated_events():
+    lines = [b'data: {"a":', b"data: 1}", b"", "data: {\"b\": 2}\r"]
+    assert list(iter_sse_events(lines)) == [{"a": 1}, {"b": 2}]
+
+def test_streamed_response_arrives_early_and_is_reassembled(server, monkeypatch):
+    monkeypatch.setitem(GEMINI_CONFIG["streaming"], "enabled", True)
+    server.stream_words = 1
+    server.stream_interval = 0.2
+    client = GeminiClient()
+    expected = extract_text(client.post(_text_payload("texto"), url=server.api_url).json())
+
+    pieces = []
+    arrivals = []
+    start = time.monotonic()
+
+    def on_text(text):
+        pieces.append(text)
+        arrivals.append(time.monotonic() - start)
+
+    response = client.post(_text_payload("texto"), url=server.api_url, on_text=on_text)
+    total = time.monotonic() - start
+
+    assert response.status_code == 200
+    assert len(pieces) == server.stats["stream_events"] == len(expected.split())
+    assert arrivals[0] < total - server.stream_interval
+    assert "".join(pieces) == extract_text(response.json()) == expected
+
+def test_retry_after_pauses_new_requests(server):
+    server.fail_next(429, retry_after=1)
+    client = GeminiClient()
+    response = client.post(_text_payload("texto"), url=server.api_url)
+    assert response.status_code == 429
+    assert retry_delay(response, 1) == 1
+
+    # O controle de concorrência segura a próxima requisição até o Retry-After
+    start = time.monotonic()
+    assert client.post(_text_payload("texto"), url=server.api_url).status_code == 200
+    assert time.monotonic() - start >= 0.9
+
+def test_failures_are_consumed_in_order(server):
+    server.fail_next(503, count=2)
+    client = GeminiClient()
+    statuses = [client.post(_text_payload("texto"), url=server.api_url).status_code for _ in range(3)]
+    assert statuses == [503, 503, 200]
+    assert server.stats["requests"] == 1
+
+def _hedging_tracker(monkeypatch, latency):
+    monkeypatch.setitem(GEMINI_CONFIG["hedging"], "enabled", True)
+    tracker = hedging.LatencyTracker(GEMINI_CONFIG["hedging"]["window"])
+    for _ in range(GEMINI_CONFIG["hedging"]["min_samples"]):
+        tracker.record(latency)
+    monkeypatch.setattr(hedging, "_tracker", tracker)
+    return tracker
+
+def test_delayed_response_is_hedged(server, monkeypatch):
+    _hedging_tracker(monkeypatch, 0.05)
+    server.delay_next(2)
+    stats = {"hedges_fired": 0, "hedges_skipped": 0, "hedges_won": 0}
+
+    async def run():
+        async with AsyncGeminiClient() as client:
+            return await hedging.hedged_post(client, _text_payload("texto"), stats, "chunk 0", url=server.api_url)
+
+    start = time.monotonic()
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert time.monotonic() - start < 1.5
+    assert stats["hedges_fired"] == stats["hedges_won"] == 1
+
+def test_requests_queued_behind_the_limit_are_not_hedged(server, monkeypatch):
+    tracker = _hedging_tracker(monkeypatch, 0.3)
+    controller = AdaptiveConcurrencyController(initial=1, minimum=1, maximum=1)
+    monkeypatch.setattr(gemini_client, "get_concurrency_controller", lambda: controller)
+    monkeypatch.setattr(hedging, "get_concurrency_controller", lambda: controller)
+    server.delay_next(0.25, count=4)
+    stats = {"hedges_fired": 0, "hedges_skipped": 0, "hedges_won": 0}
+
+    async def run():
+        async with AsyncGeminiClient() as client:
+            return await asyncio.gather(*[
+                hedging.hedged_post(client, _text_payload("texto"), stats, f"chunk {i}", url=server.api_url)
+                for i in range(4)
+            ])
+
+    assert all(response.status_code == 200 for response in asyncio.run(run()))
+    assert stats["hedges_fired"] == 0
+    # A latência registrada não inclui a espera pela vaga
+    assert tracker.percentile(100, 1) < 0.3 * 2
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import pytest
+import services.non_speech as non_speech
+from services.non_speech import TimeMap, non_speech_mask, speech_segments, condense_audio
+
+np = pytest.importorskip("numpy")
+
+FRAME_MS = 20
+FRAMES_PER_SECOND = 1000 // FRAME_MS
+
+def _speech(seconds, rng):
+    # Fala: energia que varia bastante de um quadro para o outro
+    return rng.uniform(-30, -10, int(seconds * FRAMES_PER_SECOND))
+
+def _silence(seconds):
+    return np.full(int(seconds * FRAMES_PER_SECOND), -80.0)
+
+def _energy(*pieces):
+    energy = np.concatenate(pieces)
+    return energy, len(energy) * FRAME_MS
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+def test_long_silence_is_removed_with_padding(rng):
+    energy, duration_ms = _energy(_speech(10, rng), _silence(8), _speech(10, rng))
+    # 0,5 s de margem de cada lado do trecho removido (10 s a 18 s)
+    assert speech_segments(energy, duration_ms) == [(0, 10500), (17500, 10500)]
+
+def test_short_silence_is_kept(rng):
+    energy, duration_ms = _energy(_speech(10, rng), _silence(3), _speech(10, rng))
+    assert speech_segments(energy, duration_ms) == [(0, duration_ms)]
+
+def test_silence_at_the_start_and_end_of_the_file(rng):
+    energy, duration_ms = _energy(_silence(6), _speech(10, rng), _silence(6))
+    assert speech_segments(energy, duration_ms) == [(0, 500), (5500, 11000), (21500, 500)]
+
+def test_steady_sound_is_marked_as_non_speech(rng):
+    # O silêncio inicial dá o ruído de fundo (percentil 5) abaixo do qual tudo é silêncio
+    music = rng.normal(-20, 0.3, 8 * FRAMES_PER_SECOND)
+    energy, _ = _energy(_silence(3), _speech(10, rng), music, _speech(10, rng))
+    mask = non_speech_mask(energy, FRAME_MS)
+    second = FRAMES_PER_SECOND
+    assert mask[14 * second:20 * second].all()
+    assert not mask[4 * second:12 * second].any()
+
+def test_time_map_at_segment_boundaries():
+    time_map = TimeMap([(0, 1000), (5000, 2000), (10000, 500)])
+    assert time_map.kept_ms == 3500
+    assert time_map.to_original(0) == 0
+    assert time_map.to_original(999) == 999
+    assert time_map.to_original(1000) == 5000
+    assert time_map.to_original(2999) == 6999
+    assert time_map.to_original(3000) == 10000
+    assert time_map.to_original(3500) == 10500
+    # Além do fim do áudio condensado, fica no fim do último trecho
+    assert time_map.to_original(4000) == 10500
+
+def test_condensed_files_are_unique_per_job(tmp_path, monkeypatch, rng):
+    energy, duration_ms = _energy(_speech(10, rng), _silence(8), _speech(10, rng))
+    monkeypatch.setattr(non_speech, "energy_profile", lambda input_file: energy)
+    monkeypatch.setattr(non_speech.subprocess, "run",
+                        lambda args, **kwargs: subprocess.CompletedProcess(args, 0, "", ""))
+    info = {"duration_ms": duration_ms, "sample_rate": 16000, "channels": 1}
+
+    first = condense_audio("entrada.wav", info, str(tmp_path))
+    second = condense_audio("entrada.wav", info, str(tmp_path))
+    assert first[0] != second[0]
+    assert os.path.dirname(first[0]) == str(tmp_path)
+
+def test_failed_condense_leaves_no_file(tmp_path, monkeypatch, rng):
+    energy, duration_ms = _energy(_speech(10, rng), _silence(8), _speech(10, rng))
+    monkeypatch.setattr(non_speech, "energy_profile", lambda input_file: energy)
+    monkeypatch.setattr(non_speech.subprocess, "run",
+                        lambda args, **kwargs: subprocess.CompletedProcess(args, 1, "", "erro"))
+    info = {"duration_ms": duration_ms, "sample_rate": 16000, "channels": 1}
+
+    assert condense_audio("entrada.wav", info, str(tmp_path)) is None
+    assert os.listdir(tmp_path) == []
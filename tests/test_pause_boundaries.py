@@ -0,0 +1,47 @@
+import pytest
+from config.config import GEMINI_CONFIG
+from utils.audio_processing import find_pause_ms, plan_chunks_at_pauses
+
+np = pytest.importorskip("numpy")
+
+FRAME_MS = 20
+
+def _speech(seconds, level=-20.0):
+    return np.full(int(seconds * 1000) // FRAME_MS, level)
+
+def _with(energy, start_s, seconds, level):
+    energy = energy.copy()
+    first = int(start_s * 1000) // FRAME_MS
+    energy[first:first + max(1, int(seconds * 1000) // FRAME_MS)] = level
+    return energy
+
+def _find(energy, start_ms, end_ms):
+    return find_pause_ms(energy, FRAME_MS, start_ms, end_ms, min_pause_ms=200, margin_db=3.0)
+
+def test_cut_falls_in_the_middle_of_a_pause_inside_the_window():
+    energy = _with(_speech(60), 55.0, 0.5, -60.0)
+    assert _find(energy, 50000, 60000) == pytest.approx(55250, abs=FRAME_MS * 2)
+
+def test_without_a_pause_the_cut_falls_in_the_quietest_run():
+    energy = _with(_speech(60), 52.0, 1.0, -26.0)
+    assert _find(energy, 50000, 60000) == pytest.approx(52500, abs=FRAME_MS * 2)
+
+def test_one_frame_dip_is_smoothed_away():
+    energy = _with(_with(_speech(60), 53.0, 0.3, -50.0), 58.0, 0.02, -80.0)
+    assert _find(energy, 50000, 60000) == pytest.approx(53150, abs=FRAME_MS * 2)
+
+def test_empty_window_returns_none():
+    assert _find(_speech(10), 20000, 30000) is None
+
+def test_chunks_end_at_pauses_and_never_exceed_chunk_ms():
+    chunk_ms = 100000
+    overlap_ms = int(GEMINI_CONFIG["chunking"]["overlap_seconds"] * 1000)
+    energy = _with(_with(_speech(250), 95.0, 0.5, -60.0), 185.0, 0.5, -60.0)
+    windows = plan_chunks_at_pauses(250000, chunk_ms, energy)
+
+    ends = [start + duration for start, duration in windows]
+    assert ends[0] == pytest.approx(95250, abs=FRAME_MS * 2)
+    assert windows[1][0] == ends[0] - overlap_ms
+    assert ends[1] == pytest.approx(185250, abs=FRAME_MS * 2)
+    assert ends[-1] == 250000
+    assert all(duration <= chunk_ms for _, duration in windows)
@@ -0,0 +1,37 @@
+import asyncio
+import pytest
+import services.retry as retry
+from services.circuit_breaker import CircuitOpenError
+from services.gemini_client import GeminiResponse
+
+def _ok(text):
+    return GeminiResponse(200, '{"candidates": [{"content": {"parts": [{"text": "%s"}]}}]}' % text, {})
+
+@pytest.fixture
+def no_wait(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry, "retry_delay", lambda response, retries: delays.append(retries) or 0)
+    return delays
+
+def test_retries_until_a_response_has_text(no_wait):
+    responses = iter([GeminiResponse(503, "indisponível", {}), _ok(""), _ok("texto")])
+    assert retry.post_with_retries(lambda: next(responses), "Chunk 1") == "texto"
+    assert no_wait == [1, 2]
+
+def test_open_circuit_gives_up_immediately(no_wait):
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise CircuitOpenError("aberto")
+
+    assert retry.post_with_retries(send, "Chunk 1") is None
+    assert calls == [1]
+    assert no_wait == []
+
+def test_async_version_returns_none_after_max_retries(no_wait):
+    async def send():
+        return GeminiResponse(500, "erro", {})
+
+    assert asyncio.run(retry.post_with_retries_async(send, "Chunk 1")) is None
+    assert len(no_wait) == retry.GEMINI_CONFIG["max_retries"] - 1
@@ -0,0 +1,79 @@
+import pytest
+import services.stage_memo as stage_memo
+import services.transcription_service as transcription_service
+from config.config import GEMINI_CONFIG
+
+@pytest.fixture
+def memo(tmp_path, monkeypatch):
+    monkeypatch.setattr(stage_memo, "STAGE_MEMO_DIR", tmp_path)
+    monkeypatch.setattr(stage_memo, "_memo", None)
+    monkeypatch.setitem(GEMINI_CONFIG["stage_memo"], "enabled", True)
+    yield
+    stage_memo._memo = None
+
+def test_windowed_improve_is_redone_when_window_prompt_or_settings_change(memo, monkeypatch):
+    calls = []
+    monkeypatch.setattr(transcription_service, "_improve_windowed",
+                        lambda text, on_text=None: calls.append(text) or "melhorado")
+    text = "palavra " * (GEMINI_CONFIG["improve_windows"]["window_chars"] // 4)
+
+    assert transcription_service.improve_transcript(text) == "melhorado"
+    assert transcription_service.improve_transcript(text) == "melhorado"
+    assert len(calls) == 1
+
+    monkeypatch.setattr(transcription_service, "IMPROVE_WINDOW_PROMPT_VERSION",
+                        transcription_service.IMPROVE_WINDOW_PROMPT_VERSION + 1)
+    transcription_service.improve_transcript(text)
+    assert len(calls) == 2
+
+    monkeypatch.setitem(GEMINI_CONFIG["improve_windows"], "context_chars", 123)
+    transcription_service.improve_transcript(text)
+    assert len(calls) == 3
+
+@pytest.mark.parametrize("version_name", [
+    "SUMMARY_MAP_PROMPT_VERSION", "SUMMARY_MERGE_PROMPT_VERSION", "SUMMARY_REDUCE_PROMPT_VERSION",
+])
+def test_map_reduce_summary_is_redone_when_any_of_its_prompts_change(memo, monkeypatch, version_name):
+    calls = []
+    monkeypatch.setattr(transcription_service, "_map_reduce_summary",
+                        lambda text, on_text=None: calls.append(text) or "análise")
+    text = "palavra " * (GEMINI_CONFIG["summary_map_reduce"]["threshold_chars"] // 4)
+
+    transcription_service.generate_summary_and_insights(text)
+    transcription_service.generate_summary_and_insights(text)
+    assert len(calls) == 1
+
+    monkeypatch.setattr(transcription_service, version_name, getattr(transcription_service, version_name) + 1)
+    transcription_service.generate_summary_and_insights(text)
+    assert len(calls) == 2
+
+def test_short_summary_key_ignores_map_reduce_versions(memo, monkeypatch):
+    calls = []
+    monkeypatch.setattr(transcription_service, "get_gemini_client", lambda: _FakeClient(calls))
+    transcription_service.generate_summary_and_insights("texto curto")
+    monkeypatch.setattr(transcription_service, "SUMMARY_REDUCE_PROMPT_VERSION", 99)
+    transcription_service.generate_summary_and_insights("texto curto")
+    assert len(calls) == 1
+
+class _FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {"candidates": [{"content": {"parts": [{"text": "análise curta"}]}}]}
+
+class _FakeClient:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def post(self, payload, on_text=None):
+        self.calls.append(payload)
+        return _FakeResponse()
+
+def test_memo_hit_forwards_cached_text_to_on_text(memo, monkeypatch):
+    monkeypatch.setattr(transcription_service, "_generate_text", lambda prompt, on_text=None: "janela melhorada")
+    streamed = []
+
+    transcription_service._improve_window("prompt da janela", on_text=streamed.append)
+    assert streamed == []  # o _generate_text falso não faz streaming
+    assert transcription_service._improve_window("prompt da janela", on_text=streamed.append) == "janela melhorada"
+    assert streamed == ["janela melhorada"]
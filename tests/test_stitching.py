@@ -0,0 +1,49 @@
+from services.audio_processing import stitch_texts, TranscriptStitcher
+
+def test_removes_overlap_at_the_boundary():
+    left = "bom dia a todos vamos começar a reunião de hoje com o orçamento"
+    right = "reunião de hoje com o orçamento do próximo trimestre"
+    assert stitch_texts([left, right]) == (
+        "bom dia a todos vamos começar a reunião de hoje com o orçamento do próximo trimestre"
+    )
+
+def test_drops_word_cut_at_the_end_of_the_first_chunk():
+    left = "precisamos revisar os contratos com os fornece"
+    right = "os contratos com os fornecedores até sexta"
+    assert stitch_texts([left, right]) == "precisamos revisar os contratos com os fornecedores até sexta"
+
+def test_repeated_phrase_away_from_the_boundary_is_not_an_overlap():
+    left = (
+        "eu acho que a gente precisa falar de que forma o projeto vai ser entregue "
+        "porque o cliente pediu um cronograma novo e ainda não respondemos nada sobre isso"
+    )
+    right = (
+        "ninguém sabe ainda de que forma resolver isso rapidamente com eles "
+        "então vamos marcar outra conversa"
+    )
+    stitched = stitch_texts([left, right])
+    assert left in stitched
+    assert right in stitched
+
+def test_short_common_run_is_not_enough():
+    left = "e então ele disse que sim"
+    right = "que sim é a resposta certa"
+    assert stitch_texts([left, right]) == f"{left} {right}"
+
+def test_keeps_line_breaks_and_speaker_turns():
+    left = "Ana: vamos começar.\nBruno: concordo, podemos ver\nos números do mês"
+    right = "podemos ver\nos números do mês\nAna: ótimo, então comece."
+    assert stitch_texts([left, right]) == (
+        "Ana: vamos começar.\nBruno: concordo, podemos ver\nos números do mês\nAna: ótimo, então comece."
+    )
+
+def test_partial_releases_rebuild_the_final_text():
+    chunks = [
+        " ".join(f"a{i}" for i in range(40)) + "\nBruno: " + " ".join(f"b{i}" for i in range(10)),
+        " ".join(f"b{i}" for i in range(6, 10)) + "\nAna: " + " ".join(f"c{i}" for i in range(40)),
+    ]
+    stitcher = TranscriptStitcher()
+    released = "".join(stitcher.add(text) for text in chunks) + stitcher.finish()
+    assert released == stitch_texts(chunks)
+    assert "\nBruno: " in released and "\nAna: " in released
+    assert released.count("b9") == 1
@@ -1,38 +1,385 @@
 import os
+import json
 import math
-from pydub import AudioSegment
 import logging
-from config.config import OUTPUT_DIR
+import mimetypes
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from config.config import OUTPUT_DIR, GEMINI_CONFIG
+from utils.metrics import metrics
 
-def split_audio_file(input_file, max_size_mb=15):
-    """Divide um arquivo de áudio em partes menores que o limite da API"""
+try:
+    import numpy as np
+except ImportError:  # numpy não instalado: os chunks são cortados em durações fixas
+    np = None
+
+# Bytes por amostra do PCM exportado (pcm_s16le)
+PCM_SAMPLE_WIDTH = 2
+
+# Reserva para os cabeçalhos do contêiner (RIFF, Ogg, ID3) e metadados do ffmpeg
+CONTAINER_OVERHEAD_BYTES = 4096
+
+# Codecs de exportação dos chunks: encoder do ffmpeg, extensão, mimeType da API
+# e se o tamanho segue a taxa de bits nominal (opus, mp3) ou o PCM (wav, flac)
+AUDIO_CODECS = {
+    "wav": {"encoder": "pcm_s16le", "extension": "wav", "mime_type": "audio/wav", "nominal_bitrate": False},
+    "flac": {"encoder": "flac", "extension": "flac", "mime_type": "audio/flac", "nominal_bitrate": False},
+    "opus": {"encoder": "libopus", "extension": "ogg", "mime_type": "audio/ogg", "nominal_bitrate": True,
+             "options": ["-application", "voip", "-vbr", "constrained"]},
+    "mp3": {"encoder": "libmp3lame", "extension": "mp3", "mime_type": "audio/mp3", "nominal_bitrate": True},
+}
+
+# Taxas de amostragem aceitas pelo libopus
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Folga sobre a taxa nominal: VBR e páginas do contêiner passam um pouco dela
+BITRATE_MARGIN = 1.1
+
+# Análise de energia para achar pausas: PCM mono de 8 kHz em quadros de 20 ms,
+# lido do ffmpeg em blocos de ANALYSIS_BLOCK_FRAMES quadros
+ANALYSIS_SAMPLE_RATE = 8000
+ENERGY_FRAME_MS = 20
+ANALYSIS_BLOCK_FRAMES = 500
+
+# Fração do tamanho usada ao dividir de novo um chunk que passou do limite
+RESPLIT_MARGIN = 0.95
+
+def chunk_duration_ms(bytes_per_ms, max_size_mb):
+    """Duração máxima de um chunk: limite de tamanho da API e limite configurado em segundos"""
+    by_size = math.floor(max_size_mb * 1024 * 1024 / bytes_per_ms)
+    return max(1, min(by_size, int(GEMINI_CONFIG["chunking"]["max_chunk_seconds"] * 1000)))
+
+def plan_chunks(duration_ms, chunk_ms, overlap_ms=None):
+    """
+    Janelas (início, duração) em ms que cobrem o áudio inteiro. Cada janela
+    começa overlap_ms antes do fim da anterior, para que as palavras cortadas
+    na fronteira apareçam inteiras em pelo menos um dos chunks.
+    """
+    if overlap_ms is None:
+        overlap_ms = int(GEMINI_CONFIG["chunking"]["overlap_seconds"] * 1000)
+    # A sobreposição nunca passa da metade do chunk, senão o passo fica pequeno demais
+    overlap_ms = max(0, min(overlap_ms, chunk_ms // 2))
+    step = chunk_ms - overlap_ms
+
+    windows = []
+    start = 0
+    while True:
+        end = min(start + chunk_ms, duration_ms)
+        windows.append((start, end - start))
+        if end >= duration_ms:
+            return windows
+        start += step
+
+def ffmpeg_pcm_args(input_file):
+    """Comando ffmpeg que decodifica a entrada para PCM mono de 8 kHz na saída padrão"""
+    return [
+        'ffmpeg', '-v', 'error',
+        '-i', input_file,
+        '-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE),
+        '-'
+    ]
+
+def energy_profile(input_file, frame_ms=ENERGY_FRAME_MS):
+    """
+    Energia em dB de cada quadro de frame_ms do áudio. O PCM chega do ffmpeg
+    em blocos e só o vetor de energias (um float por quadro) fica em memória.
+    Retorna None em caso de erro.
+    """
+    frame_samples = ANALYSIS_SAMPLE_RATE * frame_ms // 1000
+    frame_bytes = frame_samples * 2
+    process = subprocess.Popen(ffmpeg_pcm_args(input_file), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    energies = []
+    pending = b""
+    while True:
+        block = process.stdout.read(frame_bytes * ANALYSIS_BLOCK_FRAMES)
+        if not block:
+            break
+        data = pending + block
+        usable = len(data) - len(data) % frame_bytes
+        pending = data[usable:]
+        frames = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32).reshape(-1, frame_samples)
+        energies.append(10 * np.log10(np.mean(frames * frames, axis=1) + 1.0))
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        logging.error(f"Erro na análise de energia de {input_file}: {stderr.decode(errors='ignore')}")
+        return None
+    return np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+
+def find_pause_ms(energy, frame_ms, start_ms, end_ms, min_pause_ms, margin_db):
+    """
+    Ponto de corte em [start_ms, end_ms]: o meio da pausa mais próxima de
+    end_ms. A energia é suavizada em min_pause_ms, para que um quadro isolado
+    entre sílabas não conte como pausa, e são pausas os trechos até margin_db
+    acima do mínimo da janela. Retorna None se a janela estiver vazia.
+    """
+    first = max(0, start_ms // frame_ms)
+    last = min(len(energy), end_ms // frame_ms)
+    if last <= first:
+        return None
+    width = max(1, min_pause_ms // frame_ms)
+    window = np.pad(energy[first:last], (width // 2, width - 1 - width // 2), mode="edge")
+    smoothed = np.convolve(window, np.ones(width) / width, mode="valid")
+
+    quiet = np.flatnonzero(smoothed <= smoothed.min() + margin_db)
+    # Trecho contínuo de quadros quietos que termina mais perto do fim planejado
+    breaks = np.flatnonzero(np.diff(quiet) > 1)
+    run_start = quiet[breaks[-1] + 1] if breaks.size else quiet[0]
+    center = (run_start + quiet[-1]) // 2
+    return (first + int(center)) * frame_ms + frame_ms // 2
+
+def plan_chunks_at_pauses(duration_ms, chunk_ms, energy, overlap_ms=None, frame_ms=ENERGY_FRAME_MS):
+    """
+    Como plan_chunks, mas cada chunk termina na pausa mais próxima do fim
+    planejado, dentro da tolerância configurada. Os chunks nunca passam de
+    chunk_ms, então o limite de tamanho continua valendo.
+    """
+    settings = GEMINI_CONFIG["chunking"]
+    if overlap_ms is None:
+        overlap_ms = int(settings["overlap_seconds"] * 1000)
+    overlap_ms = max(0, min(overlap_ms, chunk_ms // 2))
+    # A tolerância não pode encolher o chunk a ponto de o próximo não avançar
+    tolerance_ms = min(int(settings["pause_tolerance_seconds"] * 1000), (chunk_ms - overlap_ms) // 2)
+
+    windows = []
+    start = 0
+    while True:
+        end = start + chunk_ms
+        if end >= duration_ms:
+            windows.append((start, duration_ms - start))
+            return windows
+        pause = find_pause_ms(energy, frame_ms, end - tolerance_ms, end,
+                              settings["pause_min_ms"], settings["pause_margin_db"])
+        if pause is not None:
+            end = min(end, pause)
+        windows.append((start, end - start))
+        start = end - overlap_ms
+
+def plan_windows(input_file, duration_ms, chunk_ms, overlap_ms=None):
+    """
+    Janelas (início, duração) dos chunks de uma entrada: nas pausas quando a
+    análise de energia está ativa e disponível, senão em durações fixas.
+    """
+    if duration_ms <= chunk_ms or np is None or not GEMINI_CONFIG["chunking"]["pause_boundaries"]:
+        return plan_chunks(duration_ms, chunk_ms, overlap_ms)
+    energy = energy_profile(input_file)
+    if energy is None or not len(energy):
+        return plan_chunks(duration_ms, chunk_ms, overlap_ms)
+    return plan_chunks_at_pauses(duration_ms, chunk_ms, energy, overlap_ms)
+
+def ffprobe_audio_args(input_file):
+    """Comando ffprobe que imprime, em JSON, a duração e o formato do primeiro stream de áudio"""
+    return [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'format=duration:stream=sample_rate,channels',
+        '-of', 'json',
+        input_file
+    ]
+
+def parse_audio_info(output):
+    """Interpreta a saída de ffprobe_audio_args: {"duration_ms", "sample_rate", "channels"}"""
+    data = json.loads(output)
+    stream = (data.get("streams") or [{}])[0]
+    return {
+        "duration_ms": int(float(data["format"]["duration"]) * 1000),
+        "sample_rate": int(stream.get("sample_rate") or 0),
+        "channels": int(stream.get("channels") or 0),
+    }
+
+def _capped(value, limit):
+    """Menor entre o valor da entrada e o teto configurado; zero/None significa desconhecido ou sem teto"""
+    if not value or not limit:
+        return value or limit or 0
+    return min(value, limit)
+
+def export_format(info):
+    """
+    Formato de exportação dos chunks de uma entrada, a partir de upload_codec:
+    encoder, extensão, mimeType, taxa de bits, taxa de amostragem e canais.
+    Codec desconhecido cai para WAV.
+    """
+    settings = GEMINI_CONFIG["upload_codec"]
+    codec = settings["codec"]
+    if codec not in AUDIO_CODECS:
+        logging.warning(f"Codec de upload desconhecido: {codec}, usando wav")
+        codec = "wav"
+    spec = AUDIO_CODECS[codec]
+
+    sample_rate = _capped(info.get("sample_rate"), settings.get("sample_rate"))
+    if codec == "opus" and sample_rate:
+        sample_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= sample_rate), OPUS_SAMPLE_RATES[-1])
+
+    return {
+        "codec": codec,
+        "encoder": spec["encoder"],
+        "extension": spec["extension"],
+        "mime_type": spec["mime_type"],
+        "options": spec.get("options", []),
+        "bitrate": settings.get("bitrate") if spec["nominal_bitrate"] else None,
+        "sample_rate": sample_rate,
+        "channels": _capped(info.get("channels"), settings.get("channels")),
+    }
+
+def audio_mime_type(audio_file):
+    """mimeType de um arquivo de áudio pela extensão; chunks exportados usam o do codec"""
+    extension = os.path.splitext(audio_file)[1].lstrip(".").lower()
+    for spec in AUDIO_CODECS.values():
+        if spec["extension"] == extension:
+            return spec["mime_type"]
+    mime_type, _ = mimetypes.guess_type(audio_file)
+    return mime_type or "audio/wav"
+
+def output_bytes_per_ms(fmt):
+    """
+    Bytes por ms do chunk exportado, que é o que conta para o limite da API.
+    Opus e MP3: taxa de bits nominal, com folga; WAV e FLAC: taxa de
+    amostragem × canais × largura da amostra (o FLAC fica abaixo disso).
+    Retorna None se o formato for desconhecido.
+    """
+    if fmt["bitrate"]:
+        return fmt["bitrate"] * BITRATE_MARGIN / 8 / 1000
+    if not fmt["sample_rate"] or not fmt["channels"]:
+        return None
+    return fmt["sample_rate"] * fmt["channels"] * PCM_SAMPLE_WIDTH / 1000
+
+def plan_chunk_duration_ms(input_file, info, fmt, max_size_mb):
+    """
+    Duração dos chunks pelo tamanho real do formato exportado. Sem informação
+    do stream, usa os bytes por ms do arquivo de entrada como estimativa.
+    """
+    bytes_per_ms = output_bytes_per_ms(fmt)
+    if bytes_per_ms is None:
+        logging.warning(f"Formato de {input_file} desconhecido, estimando o tamanho pela entrada")
+        bytes_per_ms = os.path.getsize(input_file) / info["duration_ms"]
+    usable_mb = max_size_mb - CONTAINER_OVERHEAD_BYTES / 1024 / 1024
+    return chunk_duration_ms(bytes_per_ms, usable_mb)
+
+def is_oversized(chunk_path, max_size_mb):
+    return os.path.getsize(chunk_path) > max_size_mb * 1024 * 1024
+
+def resplit_windows(start_ms, duration_ms, size_bytes, max_size_mb, overlap_ms=None):
+    """
+    Janelas menores para um chunk que ficou acima do limite depois de
+    exportado: o número de partes vem do excesso medido, com folga, e as
+    partes têm durações iguais contando a sobreposição entre elas.
+    """
+    if overlap_ms is None:
+        overlap_ms = int(GEMINI_CONFIG["chunking"]["overlap_seconds"] * 1000)
+    parts = max(2, math.ceil(size_bytes / (max_size_mb * 1024 * 1024 * RESPLIT_MARGIN)))
+    chunk_ms = max(1, math.ceil((duration_ms + (parts - 1) * overlap_ms) / parts))
+    return [(start_ms + start, duration) for start, duration in plan_chunks(duration_ms, chunk_ms, overlap_ms)]
+
+def resplit_path(chunk_path, part):
+    """Caminho da parte de um chunk dividido de novo: chunk_3.ogg -> chunk_3_1.ogg"""
+    base, extension = os.path.splitext(chunk_path)
+    return f"{base}_{part}{extension}"
+
+def ffmpeg_extract_args(input_file, chunk_path, start_ms, duration_ms, fmt):
+    """
+    Comando ffmpeg que extrai um trecho no formato de exportação (ver
+    export_format). O -ss antes de -i faz o seek no arquivo de entrada: só o
+    trecho pedido é decodificado. A saída é bitexact (sem número de série
+    aleatório no Ogg nem versão do ffmpeg nos metadados): o mesmo trecho gera
+    sempre os mesmos bytes, que é o que o cache de transcrições compara.
+    """
+    args = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-ss', f"{start_ms / 1000:.3f}",
+        '-t', f"{duration_ms / 1000:.3f}",
+        '-i', input_file,
+        '-vn', '-map_metadata', '-1',
+        '-fflags', '+bitexact', '-flags:a', '+bitexact',
+        '-acodec', fmt["encoder"], *fmt["options"]
+    ]
+    if fmt["sample_rate"]:
+        args += ['-ar', str(fmt["sample_rate"])]
+    if fmt["channels"]:
+        args += ['-ac', str(fmt["channels"])]
+    if fmt["bitrate"]:
+        args += ['-b:a', str(fmt["bitrate"])]
+    args.append(chunk_path)
+    return args
+
+def probe_audio(input_file):
+    """Duração e formato do áudio via ffprobe, sem decodificar o arquivo"""
+    result = subprocess.run(ffprobe_audio_args(input_file), capture_output=True, text=True)
+    if result.returncode != 0:
+        logging.error(f"Erro no ffprobe: {result.stderr}")
+        return None
+    return parse_audio_info(result.stdout)
+
+def extract_chunk(input_file, chunk_path, start_ms, duration_ms, fmt):
+    """Extrai um trecho com ffmpeg; retorna o caminho ou None em caso de erro"""
+    result = subprocess.run(
+        ffmpeg_extract_args(input_file, chunk_path, start_ms, duration_ms, fmt),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        logging.error(f"Erro ao extrair {chunk_path}: {result.stderr}")
+        return None
+    return chunk_path
+
+def extract_fitting(input_file, chunk_path, start_ms, duration_ms, fmt, max_size_mb, overlap_ms=None, depth=0):
+    """
+    Extrai um trecho e confere o tamanho do arquivo gerado; se passou do
+    limite, apaga e extrai de novo em partes menores. Retorna a lista de
+    janelas (caminho, início, duração) em ordem, ou None em caso de erro.
+    """
+    if not extract_chunk(input_file, chunk_path, start_ms, duration_ms, fmt):
+        return None
+    if not is_oversized(chunk_path, max_size_mb):
+        return [(chunk_path, start_ms, duration_ms)]
+    if depth >= GEMINI_CONFIG["chunking"]["max_resplits"]:
+        logging.warning(f"{chunk_path} continua acima de {max_size_mb} MB após {depth} divisões")
+        return [(chunk_path, start_ms, duration_ms)]
+
+    size_bytes = os.path.getsize(chunk_path)
+    os.remove(chunk_path)
+    windows = resplit_windows(start_ms, duration_ms, size_bytes, max_size_mb, overlap_ms)
+    logging.info(f"{chunk_path} ficou com {size_bytes / 1024 / 1024:.1f} MB, dividindo em {len(windows)} partes")
+    metrics.incr("chunking.resplits")
+    fitted = []
+    for part, (start, duration) in enumerate(windows):
+        parts = extract_fitting(input_file, resplit_path(chunk_path, part), start, duration,
+                                fmt, max_size_mb, overlap_ms, depth + 1)
+        if parts is None:
+            return None
+        fitted.extend(parts)
+    return fitted
+
+def split_audio_file(input_file, max_size_mb=15, overlap_ms=None, output_dir=OUTPUT_DIR):
+    """
+    Divide um arquivo de áudio em partes menores que o limite da API, com
+    sobreposição entre elas. A duração vem do ffprobe e cada chunk é extraído
+    por seek, então a memória usada não depende do tamanho da entrada. O
+    tamanho dos chunks é planejado pelo formato exportado (upload_codec) e
+    conferido depois da extração; as fronteiras caem em pausas (plan_windows).
+    """
     try:
-        # Carregar o áudio
-        audio = AudioSegment.from_file(input_file)
+        # Duração e formato, sem carregar o áudio
+        info = probe_audio(input_file)
+        if not info or not info["duration_ms"]:
+            return None
         
-        # Calcular duração total em milissegundos
-        duration_ms = len(audio)
+        # Calcular a duração máxima por chunk
+        fmt = export_format(info)
+        chunk_duration = plan_chunk_duration_ms(input_file, info, fmt, max_size_mb)
+        windows = plan_windows(input_file, info["duration_ms"], chunk_duration, overlap_ms)
         
-        # Estimar o tamanho por minuto
-        size_bytes = os.path.getsize(input_file)
-        bytes_per_ms = size_bytes / duration_ms
+        os.makedirs(output_dir, exist_ok=True)
+        paths = [os.path.join(output_dir, f"chunk_{index}.{fmt['extension']}") for index in range(len(windows))]
         
-        # Calcular a duração máxima por chunk
-        max_size_bytes = max_size_mb * 1024 * 1024
-        chunk_duration = math.floor(max_size_bytes / bytes_per_ms)
+        # Cada processo ffmpeg lê apenas o seu trecho; alguns rodam em paralelo
+        with ThreadPoolExecutor(max_workers=GEMINI_CONFIG["ffmpeg_workers"]) as executor:
+            fitted = list(executor.map(
+                lambda args: extract_fitting(input_file, *args, fmt, max_size_mb, overlap_ms),
+                [(path, start, duration) for path, (start, duration) in zip(paths, windows)]
+            ))
         
-        chunks = []
-        for start in range(0, duration_ms, chunk_duration):
-            # Extrair chunk do áudio
-            end = min(start + chunk_duration, duration_ms)
-            chunk = audio[start:end]
-            
-            # Salvar chunk
-            chunk_path = os.path.join(OUTPUT_DIR, f"chunk_{len(chunks)}.wav")
-            chunk.export(chunk_path, format="wav")
-            chunks.append(chunk_path)
-            
-        return chunks
+        if not all(fitted):
+            return None
+        return [path for parts in fitted for path, _, _ in parts]
     except Exception as e:
         logging.error(f"Erro ao dividir áudio: {e}")
         return None
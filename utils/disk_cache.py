@@ -0,0 +1,73 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from utils.metrics import metrics
+
+class DiskCache:
+    """Cache de textos em disco, com despejo LRU quando passa do tamanho máximo"""
+
+    def __init__(self, directory, max_bytes, name):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.txt"
+
+    def get(self, key):
+        """Retorna o valor armazenado ou None, contabilizando acerto ou falha"""
+        path = self._path(key)
+        try:
+            value = path.read_text(encoding="utf-8")
+            # Atualiza o horário de modificação, usado como ordem de uso recente
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.incr(f"{self.name}.misses")
+            return None
+        metrics.incr(f"{self.name}.hits")
+        return value
+
+    def put(self, key, value):
+        """Armazena um valor e despeja as entradas menos usadas se necessário"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(value, encoding="utf-8")
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.directory.glob("*/*.txt"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                total -= size
+                metrics.incr(f"{self.name}.evictions")
+                if total <= self.max_bytes:
+                    break
+            logging.info(f"Cache {self.name}: entradas antigas removidas, {total} bytes em uso")
+
+    def stats(self):
+        """Contadores de acertos, falhas e despejos"""
+        return {
+            "hits": metrics.get(f"{self.name}.hits"),
+            "misses": metrics.get(f"{self.name}.misses"),
+            "evictions": metrics.get(f"{self.name}.evictions"),
+        }
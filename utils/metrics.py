@@ -0,0 +1,34 @@
+import threading
+
+class MetricsRegistry:
+    """Registro simples de contadores e medidores, compartilhado pelo processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    def incr(self, name, amount=1):
+        """Incrementa um contador"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        """Define o valor atual de um medidor"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name, default=0):
+        """Retorna o valor de um contador ou medidor"""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+
+    def snapshot(self, prefix=""):
+        """Retorna uma cópia de todos os valores, opcionalmente filtrados por prefixo"""
+        with self._lock:
+            values = {**self._counters, **self._gauges}
+        return {name: value for name, value in values.items() if name.startswith(prefix)}
+
+metrics = MetricsRegistry()
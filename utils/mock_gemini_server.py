@@ -0,0 +1,253 @@
+"""
+Servidor local que imita a API Gemini para testes e benchmarks.
+
+Implementa:
+- POST /v1beta/models/<modelo>:generateContent
+- POST /v1beta/models/<modelo>:streamGenerateContent?alt=sse (eventos SSE)
+- Upload resumível da API de arquivos (start, upload, finalize, query)
+- GET /v1beta/files/<id>
+
+As respostas de generateContent descrevem o que foi recebido (texto e tamanho
+de cada áudio), o que permite verificar o conteúdo enviado; lotes de clipes
+rotulados com [CLIPE n] recebem uma seção por rótulo e pedidos com
+responseSchema recebem um JSON com a descrição em cada campo. Falhas e atrasos
+podem ser injetados com fail_next() e delay_next() para exercitar novas
+tentativas, Retry-After e requisições duplicadas (hedging).
+
+Uso:
+    python -m utils.mock_gemini_server [porta]
+
+    GEMINI_API_URL=http://127.0.0.1:<porta>/v1beta/models/mock:generateContent \\
+    GEMINI_UPLOAD_URL=http://127.0.0.1:<porta>/upload/v1beta/files \\
+    python gui_app.py
+"""
+
+import sys
+import json
+import time
+import re
+import base64
+import itertools
+import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_sse(self, result):
+        """Envia a resposta em eventos SSE de poucas palavras, com stream_interval entre eles"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        text = result["candidates"][0]["content"]["parts"][0]["text"]
+        words = re.findall(r"\S+\s*", text)
+        for start in range(0, len(words), self.server.stream_words):
+            piece = "".join(words[start:start + self.server.stream_words])
+            event = {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}}]}
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            self.server.stats["stream_events"] += 1
+            time.sleep(self.server.stream_interval)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _inject_failure(self):
+        failure = self.server.pop_failure()
+        if not failure:
+            return False
+        status, retry_after = failure
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+        self._send_json({"error": {"code": status, "message": "falha simulada"}}, status, headers)
+        return True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.startswith("/v1beta/files/"):
+            file_info = self.server.files.get(path[len("/v1beta/"):])
+            if file_info:
+                return self._send_json(file_info)
+        self._send_json({"error": {"code": 404, "message": "não encontrado"}}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/upload/"):
+            return self._handle_upload(url)
+        body = self._read_body()
+        if ":generateContent" in url.path or ":streamGenerateContent" in url.path:
+            delay = self.server.pop_delay()
+            if delay:
+                time.sleep(delay)
+            if self._inject_failure():
+                return
+            result = self.server.generate(json.loads(body))
+            if ":streamGenerateContent" in url.path:
+                return self._send_sse(result)
+            return self._send_json(result)
+        self._send_json({"error": {"code": 404, "message": "não encontrado"}}, 404)
+
+    def _handle_upload(self, url):
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        upload_id = parse_qs(url.query).get("upload_id", [None])[0]
+        server = self.server
+
+        if command == "start":
+            self._read_body()
+            upload_id = str(next(server.ids))
+            server.uploads[upload_id] = {
+                "data": bytearray(),
+                "mime_type": self.headers.get("X-Goog-Upload-Header-Content-Type"),
+                "size": int(self.headers.get("X-Goog-Upload-Header-Content-Length", 0)),
+            }
+            return self._send_json({}, headers={
+                "X-Goog-Upload-URL": f"{server.base_url}/upload/v1beta/files?upload_id={upload_id}",
+                "X-Goog-Upload-Status": "active",
+            })
+
+        upload = server.uploads.get(upload_id)
+        if upload is None:
+            return self._send_json({"error": {"code": 404, "message": "upload desconhecido"}}, 404)
+
+        if command == "query":
+            self._read_body()
+            status = "final" if "file" in upload else "active"
+            if status == "final":
+                return self._send_json({"file": upload["file"]}, headers={"X-Goog-Upload-Status": status})
+            return self._send_json({}, headers={
+                "X-Goog-Upload-Status": status,
+                "X-Goog-Upload-Size-Received": str(len(upload["data"])),
+            })
+
+        offset = int(self.headers.get("X-Goog-Upload-Offset", 0))
+        chunk = self._read_body()
+        if offset != len(upload["data"]):
+            return self._send_json({"error": {"code": 400, "message": "offset inválido"}}, 400)
+        upload["data"].extend(chunk)
+        server.stats["upload_bytes"] += len(chunk)
+
+        if "finalize" in command:
+            name = f"files/{upload_id}"
+            upload["file"] = {
+                "name": name,
+                "uri": f"{server.base_url}/v1beta/{name}",
+                "mimeType": upload["mime_type"],
+                "sizeBytes": str(len(upload["data"])),
+                "state": "ACTIVE",
+            }
+            server.files[name] = upload["file"]
+            server.stats["uploads"] += 1
+            return self._send_json({"file": upload["file"]}, headers={"X-Goog-Upload-Status": "final"})
+        self._send_json({}, headers={"X-Goog-Upload-Status": "active"})
+
+class MockGeminiServer(ThreadingHTTPServer):
+    """Servidor HTTP da API simulada, executado em uma thread própria"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), MockGeminiHandler)
+        self.base_url = f"http://127.0.0.1:{self.server_port}"
+        self.api_url = f"{self.base_url}/v1beta/models/mock:generateContent"
+        self.upload_url = f"{self.base_url}/upload/v1beta/files"
+        self.ids = itertools.count(1)
+        self.uploads = {}
+        self.files = {}
+        self.stats = {"requests": 0, "uploads": 0, "upload_bytes": 0, "stream_events": 0}
+        # Respostas em streaming: palavras por evento e intervalo entre eventos
+        self.stream_words = 3
+        self.stream_interval = 0.05
+        self._failures = deque()
+        self._delays = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def fail_next(self, status=429, count=1, retry_after=None):
+        """Faz as próximas `count` chamadas generateContent falharem com `status`"""
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def delay_next(self, seconds, count=1):
+        """Atrasa as próximas `count` chamadas generateContent em `seconds` segundos"""
+        with self._lock:
+            self._delays.extend([seconds] * count)
+
+    def pop_delay(self):
+        with self._lock:
+            return self._delays.popleft() if self._delays else None
+
+    def pop_failure(self):
+        with self._lock:
+            return self._failures.popleft() if self._failures else None
+
+    def describe_part(self, part):
+        """Texto determinístico que descreve uma parte recebida"""
+        if "text" in part:
+            return f"texto:{len(part['text'])}"
+        if "inlineData" in part:
+            return f"inline:{len(base64.b64decode(part['inlineData']['data']))}"
+        if "fileData" in part:
+            name = part["fileData"]["fileUri"].split("/v1beta/")[-1]
+            file_info = self.files.get(name)
+            size = file_info["sizeBytes"] if file_info else "?"
+            return f"arquivo:{name}:{size}"
+        return "desconhecido"
+
+    def describe_clips(self, parts):
+        """Resposta rotulada para lotes de clipes: cada rótulo [CLIPE n] descreve o áudio seguinte"""
+        sections = []
+        for position, part in enumerate(parts[:-1]):
+            if re.fullmatch(r"\[CLIPE \d+\]", part.get("text", "")):
+                sections.append(f"{part['text']}\nTranscrição simulada [{self.describe_part(parts[position + 1])}]")
+        return "\n".join(sections)
+
+    def generate(self, request):
+        """Resposta generateContent para a requisição recebida"""
+        with self._lock:
+            self.stats["requests"] += 1
+        parts = request["contents"][0]["parts"]
+        text = self.describe_clips(parts)
+        if not text:
+            text = "Transcrição simulada [" + ", ".join(self.describe_part(p) for p in parts) + "]"
+        schema = request.get("generationConfig", {}).get("responseSchema")
+        if schema:
+            # Resposta estruturada: a mesma descrição em cada campo do esquema
+            text = json.dumps({name: f"{name}: {text}" for name in schema.get("properties", {})}, ensure_ascii=False)
+        return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def start_mock_server(port=0):
+    """Inicia o servidor simulado em segundo plano e o retorna"""
+    return MockGeminiServer(port).start()
+
+if __name__ == "__main__":
+    server = MockGeminiServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print(f"GEMINI_API_URL={server.api_url}")
+    print(f"GEMINI_UPLOAD_URL={server.upload_url}")
+    server.serve_forever()